@@ -0,0 +1,120 @@
+"""
+Per-request views of a document shared by the analysis stages.
+
+One /analyze_text request runs the theme, genre, structure and keyword analyses
+over the same text. An AnalyzedText computes each derived view (lowercase text,
+lines, sentences, tokens, structural counters) the first time a stage asks for
+it, and every later stage reuses it instead of splitting and tokenizing again.
+"""
+import re
+from functools import cached_property
+
+import nltk
+from nltk.corpus import stopwords
+
+from metrics import timed_stage
+
+# Numbered items, bullets and dashes at the start of a line
+TECHNICAL_LINE = re.compile(r'\d+\.|•|-')
+
+
+def load_stop_words(language='english'):
+    """NLTK stopwords as a frozenset (empty if the stopwords corpus is missing)"""
+    try:
+        return frozenset(stopwords.words(language))
+    except LookupError as e:
+        print(f"Error loading stopwords: {str(e)}")
+        return frozenset()
+
+
+class AnalyzedText:
+    """A document and its derived views, each computed on first use"""
+
+    def __init__(self, text, stop_words=frozenset()):
+        self.text = text
+        self.stop_words = stop_words
+
+    @cached_property
+    def lower(self):
+        return self.text.lower()
+
+    @cached_property
+    def lines(self):
+        return self.text.split('\n')
+
+    @cached_property
+    def non_empty_lines(self):
+        return [line for line in self.lines if line.strip()]
+
+    @cached_property
+    def lower_sentences(self):
+        """
+        Sentences of the lowercase text. Splitting the lowercase text (not the original)
+        keeps every view identical to word_tokenize(text.lower()): Punkt's decisions
+        depend on case, e.g. for abbreviations and sentence-initial capitals
+        """
+        with timed_stage('tokenize'):
+            return nltk.sent_tokenize(self.lower)
+
+    @cached_property
+    def sentence_tokens(self):
+        """Lowercase tokens of each sentence (preserve_line: the sentences are already split)"""
+        sentences = self.lower_sentences
+        with timed_stage('tokenize'):
+            return [nltk.word_tokenize(sentence, preserve_line=True) for sentence in sentences]
+
+    @cached_property
+    def tokens(self):
+        """Lowercase tokens of the whole text, the same as word_tokenize(text.lower())"""
+        return [token for word_tokens in self.sentence_tokens for token in word_tokens]
+
+    @cached_property
+    def content_tokens(self):
+        """Lowercase alphanumeric tokens that aren't stopwords"""
+        return [w for w in self.tokens if w.isalnum() and w not in self.stop_words]
+
+    @cached_property
+    def structure(self):
+        """Line and formatting counters used by the genre scorers (all 0 for blank text)"""
+        structure = {
+            "avg_line_length": 0,
+            "num_paragraphs": 0,
+            "dialogue_ratio": 0,
+            "quoted_text_ratio": 0,
+            "technical_elements": 0,
+            "formatting_elements": 0
+        }
+
+        lines = self.lines
+        non_empty_lines = self.non_empty_lines
+        if not non_empty_lines:
+            return structure
+
+        # Average line length
+        structure["avg_line_length"] = sum(len(line) for line in non_empty_lines) / len(non_empty_lines)
+
+        # Number of paragraphs (sequences of lines separated by blank lines)
+        paragraph_count = 1  # Start with 1 for the first paragraph
+        for i in range(1, len(lines)):
+            if not lines[i-1].strip() and lines[i].strip():
+                paragraph_count += 1
+        structure["num_paragraphs"] = paragraph_count
+
+        # Dialogue ratio (lines with quotes / total lines)
+        dialogue_lines = sum(1 for line in non_empty_lines if '"' in line)
+        structure["dialogue_ratio"] = dialogue_lines / len(non_empty_lines)
+
+        # Quoted text ratio: every opening quote and the characters up to the closing one
+        parts = self.text.split('"')
+        quoted_text = sum(len(parts[i]) + 1 for i in range(1, len(parts), 2))
+        structure["quoted_text_ratio"] = quoted_text / len(self.text)
+
+        # Technical elements (bullets, numbers, etc.)
+        technical_count = sum(1 for line in non_empty_lines if TECHNICAL_LINE.match(line))
+        structure["technical_elements"] = technical_count / len(non_empty_lines)
+
+        # Formatting elements (asterisks, underscores for bold/italic, etc.)
+        formatting_count = sum(line.count('*') + line.count('_') + line.count('==') for line in non_empty_lines)
+        structure["formatting_elements"] = formatting_count / len(non_empty_lines)
+
+        return structure
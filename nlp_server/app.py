@@ -1,80 +1,327 @@
 import os
 import json
-import requests
 import re
 import base64
-from flask import Flask, request, jsonify
+import hmac
+import threading
+import time
+import uuid
+from collections import Counter
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 import nltk
 import pronouncing
 from nltk.corpus import wordnet
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
-# Import the Hugging Face Transformers library
-from transformers import pipeline
+# Zero-shot model loading, batched inference and result caching
+from nli_engine import MicroBatcher, classify_chunks, score_chunks
+from result_cache import LRUCache, content_key, normalize_text
+from chunking import iter_chunks
+from jobs import JobManager, JobQueueFull
+from model_registry import DEFAULT_MODEL, NLI_MODEL_DIR, list_models, load_classifier, model_version, resolve_model
+from nltk_resources import NLTK_DATA_DIR, check_resources, use_bundled_data
+from lexicon_index import KeywordAutomaton, build_keyword_matrix, keyword_windows, load_synonym_index
+from genre_patterns import GenrePatternEngine
+from analyzed_text import AnalyzedText, load_stop_words
+from rhyme_index import build_rhyme_index, line_end_words
+from definitions import FOUND, DefinitionProvider
+from metrics import (LEGACY_FALLBACKS, METRICS_AVAILABLE, REQUEST_LATENCY, REQUESTS, collect_request_stages,
+                     gauges_due, record_cache_stats, record_resident_memory, render_metrics, timed_stage)
+from profiling import (ProfileCapture, SlowRequestSampler, log_slow_request, parse_modes, server_timing,
+                       valid_request_id)
 
 # Add HTML/XML processing libraries
 import html
-from bs4 import BeautifulSoup
 from html.parser import HTMLParser
 
-# Dictionary API configuration
-DICTIONARY_API_URL = "https://api.dictionaryapi.dev/api/v2/entries/en/"
-
-# Download required NLTK data if not already downloaded
-try:
-    nltk.data.find('corpora/wordnet')
-except LookupError:
-    nltk.download('wordnet')
-
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
-
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
-
-try:
-    nltk.data.find('taggers/averaged_perceptron_tagger')
-except LookupError:
-    nltk.download('averaged_perceptron_tagger')
-
-try:
-    nltk.data.find('taggers/maxent_treebank_pos_tagger')
-except LookupError:
-    nltk.download('maxent_treebank_pos_tagger')
-
-try:
-    nltk.data.find('corpora/brown')
-except LookupError:
-    nltk.download('brown')
-
-# Initialize the zero-shot classification pipeline with optimized settings
-print("Loading the zero-shot classification model...")
-try:
-    # Using sequence classification with specific model for better thematic analysis
-    zero_shot_classifier = pipeline("zero-shot-classification", 
-                                   model="facebook/bart-large-mnli",
-                                   device=-1)  # Auto-select device
-    print("Zero-shot classification model loaded successfully")
-except Exception as e:
-    print(f"Error loading zero-shot classification model: {str(e)}")
-    zero_shot_classifier = None
+# Dictionary API configuration (point DICTIONARY_API_URL at a local stand-in for tests)
+DICTIONARY_API_URL = os.environ.get('DICTIONARY_API_URL', "https://api.dictionaryapi.dev/api/v2/entries/en/")
+
+# Dictionary API answers are cached on disk for DEFINITION_CACHE_TTL seconds (unknown
+# words for DEFINITION_NEGATIVE_TTL). A lookup waits at most DEFINITION_DEADLINE_MS for
+# the API before answering from WordNet; the connect/read timeouts bound the call itself.
+# At most DEFINITION_MAX_PENDING words are queued or being fetched at a time
+definition_provider = DefinitionProvider(
+    DICTIONARY_API_URL,
+    os.environ.get('DEFINITION_CACHE_PATH', os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'cache', 'definitions.sqlite3')),
+    ttl_seconds=int(os.environ.get('DEFINITION_CACHE_TTL', 7 * 24 * 3600)),
+    negative_ttl_seconds=int(os.environ.get('DEFINITION_NEGATIVE_TTL', 24 * 3600)),
+    connect_timeout=float(os.environ.get('DEFINITION_CONNECT_TIMEOUT', 2)),
+    read_timeout=float(os.environ.get('DEFINITION_READ_TIMEOUT', 5)),
+    deadline_seconds=int(os.environ.get('DEFINITION_DEADLINE_MS', 1500)) / 1000,
+    max_pending=int(os.environ.get('DEFINITION_MAX_PENDING', 32)))
+
+# NLTK data is read only from the bundled directory and never downloaded at runtime;
+# run `python nltk_resources.py` at install time to populate it
+use_bundled_data()
+nltk_data_status = check_resources()
+missing_nltk_data = [package for package, found in nltk_data_status.items() if not found]
+if missing_nltk_data:
+    print(f"Missing NLTK data in {NLTK_DATA_DIR}: {', '.join(missing_nltk_data)} "
+          f"(run 'python nltk_resources.py' to install it)")
+
+# English stopwords, loaded once and shared by every request
+STOP_WORDS = load_stop_words()
+
+# Model used for zero-shot theme and genre classification: a registry name, a checkpoint
+# directory under NLI_MODEL_DIR, a local path or a Hugging Face model id
+NLI_MODEL = os.environ.get('NLI_MODEL', DEFAULT_MODEL)
+zero_shot_model = resolve_model(NLI_MODEL)
+ZERO_SHOT_MODEL = zero_shot_model['path']
+
+# CPU inference backend: 'torch' (fp32), 'torch-int8' (dynamic quantization) or 'onnx' (ONNX Runtime)
+NLI_BACKEND = os.environ.get('NLI_BACKEND', 'torch')
+# Compare the selected backend against fp32 on a fixed sample at startup
+NLI_SELF_CHECK = os.environ.get('NLI_SELF_CHECK', '0') == '1'
+
+# Number of premise/hypothesis pairs sent through the model in one forward pass
+NLI_BATCH_SIZE = int(os.environ.get('NLI_BATCH_SIZE', 16))
+
+# How the model is loaded: 'background' (default) loads it in a thread so the server
+# answers immediately, using the legacy methods until the model is ready; 'eager'
+# loads it before the server starts; 'off' never loads it
+NLI_MODEL_LOADING = os.environ.get('NLI_MODEL_LOADING', 'background')
+
+# Set by load_zero_shot_classifier once the configured backend is in place
+zero_shot_classifier = None
+ZERO_SHOT_MODEL_VERSION = None
+# Where the exported ONNX graph is stored (exported on first start if missing)
+NLI_ONNX_PATH = os.environ.get('NLI_ONNX_PATH')
+
+# Loading state of each component, reported by /ready
+component_status = {
+    'nltk_data': {'status': 'ready' if not missing_nltk_data else 'missing',
+                  'path': NLTK_DATA_DIR, 'missing': missing_nltk_data},
+    'lexicon': {'status': 'pending'},
+    'classifier': {'status': 'pending' if NLI_MODEL_LOADING != 'off' else 'disabled',
+                   'model': ZERO_SHOT_MODEL, 'backend': NLI_BACKEND, 'version': None, 'error': None}
+}
+# Set once startup loading has finished, whether or not it succeeded
+startup_done = threading.Event()
+
+def load_zero_shot_classifier():
+    """Load the zero-shot pipeline and switch it to the configured backend"""
+    global zero_shot_classifier, ZERO_SHOT_MODEL_VERSION, NLI_BACKEND, NLI_ONNX_PATH
+    
+    component_status['classifier']['status'] = 'loading'
+    start_time = time.time()
+    print(f"Loading the zero-shot classification model ({ZERO_SHOT_MODEL})...")
+    try:
+        # Using sequence classification with specific model for better thematic analysis
+        classifier = load_classifier(zero_shot_model)
+        version = model_version(zero_shot_model, classifier)
+        print(f"Zero-shot classification model loaded successfully ({version})")
+    except Exception as e:
+        print(f"Error loading zero-shot classification model: {str(e)}")
+        component_status['classifier'].update(status='failed', error=str(e))
+        return
+    
+    NLI_ONNX_PATH = NLI_ONNX_PATH or os.path.join(NLI_MODEL_DIR, 'onnx', version.replace('@', '-') + '.onnx')
+    
+    # Switch to the configured inference backend, keeping fp32 if that fails
+    if NLI_BACKEND != 'torch':
+        from inference_backends import load_backend, self_check
+        
+        fp32_classifier = classifier
+        try:
+            classifier = load_backend(fp32_classifier, NLI_BACKEND, NLI_ONNX_PATH)
+            print(f"Using '{NLI_BACKEND}' inference backend")
+        except Exception as e:
+            print(f"Error loading '{NLI_BACKEND}' inference backend, using fp32 torch: {str(e)}")
+            classifier = fp32_classifier
+            NLI_BACKEND = 'torch'
+        
+        if NLI_SELF_CHECK and classifier is not fp32_classifier:
+            try:
+                report = self_check(fp32_classifier, classifier, NLI_BATCH_SIZE)
+                print(f"Backend self-check ({NLI_BACKEND} vs fp32): {report}")
+            except Exception as e:
+                print(f"Error in backend self-check: {str(e)}")
+        
+        # Release the fp32 pipeline unless it is still the active model
+        del fp32_classifier
+    
+    # Publish the version before the classifier so no result is cached under a stale version
+    ZERO_SHOT_MODEL_VERSION = version
+    zero_shot_classifier = classifier
+    component_status['classifier'].update(status='ready', backend=NLI_BACKEND, version=version,
+                                          load_seconds=round(time.time() - start_time, 1))
+
+def load_lexicons():
+    """Load lazily initialized NLTK and pronouncing data"""
+    try:
+        wordnet.ensure_loaded()
+        nltk.sent_tokenize("Warm up the tokenizer. It is loaded on first use.")
+        pronouncing.init_cmu()
+        get_theme_synonym_index()
+        get_rhyme_index()
+        component_status['lexicon'] = {'status': 'ready'}
+    except Exception as e:
+        print(f"Error warming up NLP data: {str(e)}")
+        component_status['lexicon'] = {'status': 'failed', 'error': str(e)}
+
+def load_startup_components():
+    """Load the lexicons and the model, then mark startup as done"""
+    try:
+        load_lexicons()
+        if NLI_MODEL_LOADING != 'off':
+            load_zero_shot_classifier()
+    finally:
+        startup_done.set()
+
+# Micro-batching: NLI work from concurrent requests is collected for up to
+# NLI_MICROBATCH_WAIT_MS (or NLI_MICROBATCH_MAX_PAIRS pairs) and scored in shared
+# slices of at most NLI_MICROBATCH_MAX_PAIRS pairs, taken round-robin from the
+# waiting requests. A wait of 0 disables it and every request runs its own batches
+NLI_MICROBATCH_WAIT_MS = float(os.environ.get('NLI_MICROBATCH_WAIT_MS', 5))
+NLI_MICROBATCH_MAX_PAIRS = int(os.environ.get('NLI_MICROBATCH_MAX_PAIRS', 256))
+nli_batcher = MicroBatcher(lambda: zero_shot_classifier, NLI_BATCH_SIZE,
+                           NLI_MICROBATCH_MAX_PAIRS, NLI_MICROBATCH_WAIT_MS)
+
+# Token budget per chunk. BART reads at most 1024 tokens per premise/hypothesis pair,
+# so leave room for the hypothesis and special tokens
+CHUNK_MAX_TOKENS = int(os.environ.get('CHUNK_MAX_TOKENS', 960))
+# Tokens of trailing context repeated at the start of the next chunk (0 disables overlap)
+CHUNK_OVERLAP_TOKENS = int(os.environ.get('CHUNK_OVERLAP_TOKENS', 0))
+
+# Chunks scored per partial result of /analyze_text/stream: smaller groups report
+# sooner, larger ones share more model batches
+STREAM_CHUNK_GROUP = int(os.environ.get('STREAM_CHUNK_GROUP', 4))
+
+# Maximum number of unique words in one /get_rhymes/batch request
+RHYME_BATCH_MAX_WORDS = int(os.environ.get('RHYME_BATCH_MAX_WORDS', 5000))
+
+# Cache of /analyze_text results keyed by content hash (size 0 disables caching)
+analysis_cache = LRUCache(max_entries=int(os.environ.get('ANALYSIS_CACHE_SIZE', 256)),
+                          ttl_seconds=int(os.environ.get('ANALYSIS_CACHE_TTL', 3600)))
+
+# Cache of per-chunk model scores keyed by chunk hash, so re-analyzing an edited
+# document only runs the model on the chunks that changed
+chunk_score_cache = LRUCache(max_entries=int(os.environ.get('CHUNK_CACHE_SIZE', 4096)),
+                             ttl_seconds=int(os.environ.get('CHUNK_CACHE_TTL', 3600)))
+
+# Background executor for asynchronous /analyze_text/jobs requests; finished jobs
+# are kept for ANALYSIS_JOB_TTL seconds, at most ANALYSIS_JOB_MAX_FINISHED of them.
+# Job state is kept in SQLite so every worker process can answer polls for any job
+analysis_jobs = JobManager(os.environ.get('ANALYSIS_JOB_DB', os.path.join(
+                               os.path.dirname(os.path.abspath(__file__)), 'cache', 'jobs.sqlite3')),
+                           max_workers=int(os.environ.get('ANALYSIS_JOB_WORKERS', 2)),
+                           max_pending=int(os.environ.get('ANALYSIS_JOB_QUEUE', 32)),
+                           ttl_seconds=int(os.environ.get('ANALYSIS_JOB_TTL', 600)),
+                           max_finished=int(os.environ.get('ANALYSIS_JOB_MAX_FINISHED', 256)))
+
+# Per-request profiling (X-Profile header or ?profile=timing,cprofile,memory) is only
+# honoured when PROFILING=on, and only with a matching X-Profile-Token header if
+# PROFILING_TOKEN is set. Dumps and the slow-request log are written to PROFILE_DIR
+PROFILING = os.environ.get('PROFILING', 'off') == 'on'
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+# Allocation sites listed in a tracemalloc capture
+PROFILE_MEMORY_TOP = int(os.environ.get('PROFILE_MEMORY_TOP', 25))
+
+# Requests slower than this percentile of recent requests to their route (and than
+# SLOW_REQUEST_MIN_MS) are logged with their stage timings, whether or not profiling
+# is on (0 disables)
+slow_requests = SlowRequestSampler(percentile=float(os.environ.get('SLOW_REQUEST_PERCENTILE', 99)),
+                                   min_seconds=int(os.environ.get('SLOW_REQUEST_MIN_MS', 100)) / 1000)
 
 # Create Flask app
 app = Flask(__name__)
 CORS(app)
 
+def requested_profile_modes():
+    """Profiling modes asked for by this request, if profiling is allowed"""
+    if not PROFILING:
+        return set()
+    modes = parse_modes(request.headers.get('X-Profile') or request.args.get('profile'))
+    if modes and PROFILING_TOKEN and not hmac.compare_digest(request.headers.get('X-Profile-Token', ''),
+                                                             PROFILING_TOKEN):
+        return set()
+    return modes
+
+@app.before_request
+def start_request_timer():
+    g.request_start_time = time.perf_counter()
+    g.request_stages = collect_request_stages()
+    request_id = request.headers.get('X-Request-Id')
+    g.request_id = request_id if valid_request_id(request_id) else uuid.uuid4().hex
+
+    g.profile_modes = requested_profile_modes()
+    g.profile_capture = None
+    if g.profile_modes & {'cprofile', 'memory'}:
+        g.profile_capture = ProfileCapture.start(g.profile_modes, PROFILE_MEMORY_TOP)
+        if g.profile_capture is None:
+            print(f"Skipping profile capture of request {g.request_id}: another request is being captured")
+
+@app.after_request
+def record_request_metrics(response):
+    """Count the request and its latency by route, and refresh the process-level gauges"""
+    # The route pattern, not the URL, so job ids don't each get their own series
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUESTS.labels(route, request.method, response.status_code).inc()
+    if 'request_start_time' in g:
+        duration = time.perf_counter() - g.request_start_time
+        REQUEST_LATENCY.labels(route).observe(duration)
+        record_request_profile(response, route, duration)
+    
+    if gauges_due():
+        refresh_process_gauges()
+    return response
+
+def record_request_profile(response, route, duration):
+    """Add the profiling headers and dumps this request asked for, and log it if it was unusually slow"""
+    response.headers['X-Request-Id'] = g.request_id
+
+    capture = g.pop('profile_capture', None)
+    if capture is not None:
+        try:
+            response.headers['X-Profile-Files'] = ', '.join(capture.finish(PROFILE_DIR, g.request_id))
+        except Exception as e:
+            print(f"Error writing profile of request {g.request_id}: {str(e)}")
+    # A streamed body is generated after this runs, so its stage timings aren't known yet
+    if g.profile_modes and not response.is_streamed:
+        response.headers['Server-Timing'] = server_timing(g.request_stages, duration)
+
+    if slow_requests.observe(route, duration):
+        log_slow_request(PROFILE_DIR, {
+            'request_id': g.request_id,
+            'method': request.method,
+            'route': route,
+            'status': response.status_code,
+            'duration_ms': duration * 1000,
+            'content_length': request.content_length,
+            'stages': list(g.request_stages)
+        })
+
+@app.teardown_request
+def stop_profile_capture(exception=None):
+    """Make sure a capture never outlives its request, even if no response was made"""
+    capture = g.pop('profile_capture', None)
+    if capture is not None:
+        capture.stop()
+
+def refresh_process_gauges():
+    """Publish this process's RSS and cache counters"""
+    record_resident_memory()
+    record_cache_stats('analysis', analysis_cache.stats())
+    record_cache_stats('chunks', chunk_score_cache.stats())
+    definition_counts = definition_provider.stats()
+    record_cache_stats('definitions', {'hits': definition_counts['cache_hits'],
+                                       'misses': definition_counts['fetched'] + definition_counts['errors']})
+
 # Special handling for war poems - ensuring accurate classification
 WAR_POEM_SIGNALS = ["flanders", "poppies", "guns", "quarrel", "torch", "battle", "soldier", 
                     "crosses", "row", "ranks", "trench", "bomb", "artillery"]
 
+# War signals that may be missed by the model
+WAR_SIGNALS = ["war", "battle", "soldier", "guns", "poppies", "flanders", "crosses", 
+               "quarrel", "torch", "artillery", "trench", "bomb", "army", "military", 
+               "combat", "warrior", "enemy", "battlefield", "regiment", "battalion"]
+
+# War signals that mark a passage as war poetry in the legacy theme scorer
+WAR_CONTEXT_SIGNALS = ["flanders", "poppies", "guns", "crosses", "row", "brave", "soldier", "battle", "fought"]
+
 # Define theme categories and their associated keywords
 THEMES = {
     "Love": ["love", "heart", "romance", "passion", "emotion", "affection", "relationship", "desire", "intimate", "feelings", 
@@ -246,6 +493,12 @@ GENRES = {
 def health_check():
     return jsonify({'status': 'healthy'})
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: 200 once NLTK data, lexicons and the model are loaded, 503 until then"""
+    ready = all(component['status'] in ('ready', 'disabled') for component in component_status.values())
+    return jsonify({'ready': ready, 'components': component_status}), 200 if ready else 503
+
 @app.route('/get_rhymes', methods=['GET'])
 def get_rhymes():
     word = request.args.get('word', '').lower()
@@ -257,28 +510,83 @@ def get_rhymes():
             'synonyms': []
         })
     
-    # Get rhymes using pronouncing library
-    rhymes = pronouncing.rhymes(word)
+    near = request.args.get('near', '').lower() in ('1', 'true', 'yes')
+    return jsonify(word_suggestions(word, get_rhyme_index(), near))
+
+@app.route('/get_rhymes/batch', methods=['POST'])
+def get_rhymes_batch():
+    """
+    Rhymes and synonyms of many words in one request: a list of `words` and/or the
+    line-final words of a `text`, each unique word looked up once. For a text, the
+    rhyme scheme of its line endings is included. With `stream` the result is sent
+    as NDJSON: the scheme first, then one line per word as it is looked up.
+    """
+    data = request.get_json(silent=True)
+    if not data or not (data.get('words') or data.get('text')):
+        return jsonify({'error': 'Missing words or text in request body', 'words': {}}), 400
+    words = data.get('words') or []
+    if (not isinstance(words, list) or not all(isinstance(word, str) for word in words)
+            or not isinstance(data.get('text') or '', str)):
+        return jsonify({'error': 'words must be a list of strings and text a string', 'words': {}}), 400
+    
+    words = [word.lower().strip() for word in words]
+    line_words = line_end_words(data['text']) if data.get('text') else []
+    unique_words = list(dict.fromkeys(word for word in words + line_words if word))
+    if len(unique_words) > RHYME_BATCH_MAX_WORDS:
+        return jsonify({'error': f'Too many words (at most {RHYME_BATCH_MAX_WORDS})', 'words': {}}), 413
     
-    # Limit to 15 rhymes
-    rhymes = rhymes[:15] if rhymes else ["No rhymes found"]
+    rhyme_index = get_rhyme_index()
+    near = bool(data.get('near'))
     
-    # Get synonyms using WordNet
-    synonyms = []
-    for syn in wordnet.synsets(word):
-        for lemma in syn.lemmas():
-            synonym = lemma.name().replace('_', ' ')
-            if synonym != word and synonym not in synonyms:
-                synonyms.append(synonym)
+    header = {}
+    if data.get('text'):
+        scheme = rhyme_index.rhyme_scheme(line_words) if rhyme_index is not None else []
+        header = {
+            'line_words': [word for word in line_words if word is not None],
+            'rhyme_scheme': ' '.join(''.join(stanza) for stanza in scheme)
+        }
+    
+    if data.get('stream'):
+        def generate():
+            yield json.dumps(header) + '\n'
+            for word in unique_words:
+                yield json.dumps(word_suggestions(word, rhyme_index, near)) + '\n'
+        
+        return Response(generate(), mimetype='application/x-ndjson')
+    
+    result = dict(header)
+    result['words'] = {word: word_suggestions(word, rhyme_index, near) for word in unique_words}
+    return jsonify(result)
+
+def word_suggestions(word, rhyme_index, near=False):
+    """Rhymes and synonyms of a word as returned by /get_rhymes"""
+    # Get the 15 most common rhymes from the prebuilt index
+    if rhyme_index is not None:
+        rhymes = rhyme_index.rhymes(word, 15)
+    else:
+        rhymes = pronouncing.rhymes(word)[:15]
+    
+    rhymes = rhymes if rhymes else ["No rhymes found"]
+    
+    # Get synonyms using WordNet, keeping the first occurrence of each
+    synonyms = dict.fromkeys(lemma.name().replace('_', ' ')
+                             for syn in wordnet.synsets(word) for lemma in syn.lemmas())
+    synonyms.pop(word, None)
     
     # Limit to 15 synonyms
-    synonyms = synonyms[:15] if synonyms else ["No synonyms found"]
+    synonyms = list(synonyms)[:15] or ["No synonyms found"]
     
-    return jsonify({
+    result = {
         'word': word,
         'rhymes': rhymes,
         'synonyms': synonyms
-    })
+    }
+    
+    # Slant rhymes (same vowels, similar final consonant) on request
+    if near:
+        result['near_rhymes'] = rhyme_index.near_rhymes(word, 15) if rhyme_index is not None else []
+    
+    return result
 
 @app.route('/analyze_text', methods=['POST'])
 def analyze_text():
@@ -290,198 +598,479 @@ def analyze_text():
             'genres': {}
         })
     
-    text = data['text']
+    return jsonify(run_analysis(data['text'], data.get('use_cache', True)))
+
+@app.route('/analyze_text/stream', methods=['POST'])
+def analyze_text_stream():
+    """
+    Stream the analysis as it runs: NDJSON by default, Server-Sent Events with
+    ?format=sse or an Accept: text/event-stream header
+    """
+    data = request.get_json()
+    if not data or 'text' not in data:
+        return jsonify({'error': 'Missing text in request body'}), 400
+    
+    events = iter_analysis(data['text'], data.get('use_cache', True))
+    
+    if request.args.get('format') == 'sse' or request.accept_mimetypes.best == 'text/event-stream':
+        body = (f"event: {name}\ndata: {json.dumps(payload)}\n\n" for name, payload in events)
+        # Ask proxies not to buffer the stream
+        return Response(body, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    
+    body = (json.dumps(dict(payload, event=name)) + '\n' for name, payload in events)
+    return Response(body, mimetype='application/x-ndjson')
+
+@app.route('/analyze_text/jobs', methods=['POST'])
+def submit_analysis_job():
+    """Start an analysis in the background and return its job id right away"""
+    data = request.get_json()
+    if not data or 'text' not in data:
+        return jsonify({'error': 'Missing text in request body'}), 400
+    
+    try:
+        job_id = analysis_jobs.submit(run_analysis, data['text'], data.get('use_cache', True))
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
     
-    # Analyze themes and genres
-    themes = analyze_themes(text)
-    genres = analyze_genres(text)
-    keywords = extract_keywords(text)
+    return jsonify({'job_id': job_id, 'status': 'queued'}), 202
+
+@app.route('/analyze_text/jobs/<job_id>', methods=['GET'])
+def analysis_job_status(job_id):
+    """Status and progress (chunks scored out of total) of an analysis job"""
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
     
     return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'progress': job['progress'],
+        'error': job['error']
+    })
+
+@app.route('/analyze_text/jobs/<job_id>/result', methods=['GET'])
+def analysis_job_result(job_id):
+    """Final result of a finished analysis job"""
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    if job['status'] == 'failed':
+        return jsonify({'job_id': job_id, 'status': 'failed', 'error': job['error']}), 500
+    if job['status'] != 'done':
+        return jsonify({'job_id': job_id, 'status': job['status'], 'progress': job['progress']}), 202
+    
+    return jsonify(job['result'])
+
+def run_analysis(text, use_cache=True, progress=None):
+    """
+    Full theme, genre and keyword analysis of a document, served from the result
+    cache when possible. `progress(**fields)` receives the current stage and the
+    number of chunks scored so far.
+    """
+    # All chunks are scored as one group, so they share model batches
+    for event, payload in iter_analysis(text, use_cache, None, progress):
+        if event == 'result':
+            return payload['result']
+
+def iter_analysis(text, use_cache=True, chunk_group=STREAM_CHUNK_GROUP, progress=None):
+    """
+    Run the analysis step by step, yielding (event, payload):
+    - 'partial' after each group of `chunk_group` chunks is scored (all of them if
+      None), with theme and genre percentages of the chunks scored so far (once,
+      from the legacy methods, without the model)
+    - 'keywords' once the keywords are extracted
+    - 'result' with the final result, also cached unless the model failed
+    `progress(**fields)` receives the current stage and the number of chunks scored so far.
+    """
+    text = normalize_text(text)
+    
+    # Jobs always finish with stage 'done' and chunks_done == chunks_total; results
+    # served from the cache or by the legacy methods count as a single chunk
+    chunks_total = 1
+    
+    # Identical text analyzed by the same model and taxonomy gives the same result,
+    # so serve repeats from the cache unless the caller opts out
+    if use_cache:
+        cached_result = analysis_cache.get(content_key(text, current_model_version(), TAXONOMY_VERSION))
+        if cached_result is not None:
+            if progress is not None:
+                progress(stage='done', chunks_done=1, chunks_total=1)
+            yield 'result', {'result': cached_result}
+            return
+    
+    chunk_progress = None
+    if progress is not None:
+        def chunk_progress(done, total):
+            nonlocal chunks_total
+            chunks_total = total
+            progress(stage='themes_genres', chunks_done=done, chunks_total=total)
+    
+    # Sentences, tokens and lines are computed once and shared by every stage
+    document = as_analyzed_text(text)
+    
+    for event, payload in iter_themes_and_genres(document, use_cache, chunk_group, chunk_progress):
+        if event == 'partial':
+            yield event, payload
+    themes, genres, source = payload['themes'], payload['genres'], payload['source']
+    
+    if progress is not None:
+        progress(stage='keywords')
+    keywords = extract_keywords(document)
+    yield 'keywords', {'keywords': keywords}
+    
+    result = {
         'themes': themes,
         'genres': genres,
-        'keywords': keywords
+        'keywords': keywords,
+        'model': source or 'legacy'
+    }
+    # Legacy scores standing in for a failed model run aren't cached, so the next
+    # request tries the model again
+    if source is not None:
+        analysis_cache.set(content_key(text, source, TAXONOMY_VERSION), result)
+    
+    if progress is not None:
+        progress(stage='done', chunks_done=chunks_total, chunks_total=chunks_total)
+    yield 'result', {'result': result}
+
+def score_percentages(scores):
+    """Scores as rounded percentages of their total"""
+    total_score = sum(scores.values())
+    if total_score <= 0:
+        return {}
+    return {label: round((score / total_score) * 100) for label, score in scores.items()}
+
+@app.route('/models', methods=['GET'])
+def models():
+    return jsonify({
+        'active': current_model_version(),
+        'available': list_models()
+    })
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        'results': analysis_cache.stats(),
+        'chunks': chunk_score_cache.stats(),
+        'definitions': definition_provider.stats()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics of every worker process, in text format"""
+    if not METRICS_AVAILABLE:
+        return jsonify({'error': 'prometheus_client is not installed'}), 501
+    
+    refresh_process_gauges()
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+@app.route('/pattern_stats', methods=['GET'])
+def pattern_stats():
+    """Per-pattern match counts and match times of the legacy genre patterns"""
+    engine = legacy_indexes.get('genre_patterns')
+    return jsonify(engine.stats() if engine is not None else {})
+
+# Use more specific templates for better zero-shot theme classification
+THEME_HYPOTHESIS_TEMPLATES = [
+    "This text is about {}.",
+    "The theme of this text is {}.",
+    "This passage discusses {}."
+]
+
+# Genres use the zero-shot pipeline's default template
+GENRE_HYPOTHESIS_TEMPLATES = ["This example is {}."]
+
+# Label sets scored together against every chunk: task -> (labels, hypothesis templates)
+ANALYSIS_TASKS = {
+    'themes': (list(THEMES.keys()), THEME_HYPOTHESIS_TEMPLATES),
+    'genres': (list(GENRES.keys()), GENRE_HYPOTHESIS_TEMPLATES)
+}
+
+# Fingerprint of the label taxonomy; changing any theme, genre or template invalidates cached results
+TAXONOMY_VERSION = content_key(json.dumps({
+    'themes': THEMES,
+    'genres': GENRES,
+    'theme_templates': THEME_HYPOTHESIS_TEMPLATES,
+    'genre_templates': GENRE_HYPOTHESIS_TEMPLATES
+}, sort_keys=True))[:16]
+
+# Keyword lookup structures for the legacy scorers and the rhyme index, built on first use.
+# Each index has its own build lock, so a slow build (e.g. WordNet synonyms) doesn't hold
+# up requests that need a different index; legacy_indexes_lock only guards the lock table
+legacy_indexes = {}
+legacy_index_locks = {}
+legacy_indexes_lock = threading.Lock()
+
+# Direct keyword matches that count more than 1 in the legacy theme scorer
+THEME_KEYWORD_BOOSTS = {
+    "War/Conflict": {keyword: 1.5 for keyword in ["war", "battle", "soldier", "guns", "poppies", "flanders"]}
+}
+
+def get_legacy_index(name, build):
+    """Return the named index, building it on first use; None if it can't be built"""
+    index = legacy_indexes.get(name)
+    if index is not None:
+        return index
+
+    with legacy_indexes_lock:
+        lock = legacy_index_locks.setdefault(name, threading.Lock())
+    with lock:
+        if name not in legacy_indexes:
+            try:
+                legacy_indexes[name] = build()
+            except Exception as e:
+                print(f"Error building {name} index: {str(e)}")
+                return None
+        return legacy_indexes[name]
+
+def get_theme_synonym_index():
+    """WordNet synonyms of the theme keywords, loaded from disk (or built) per taxonomy version"""
+    return get_legacy_index('theme_synonyms', lambda: load_synonym_index(THEMES, TAXONOMY_VERSION))
+
+def get_theme_keyword_matrix():
+    """Theme weights of exact keyword hits and prefix matches (both at least 5 characters)"""
+    return get_legacy_index('theme_keywords', lambda: build_keyword_matrix(
+        THEMES, boosts=THEME_KEYWORD_BOOSTS, prefix_length=5))
+
+def get_keyword_automaton():
+    """Automaton over the theme and genre keywords and war signals"""
+    return get_legacy_index('keyword_automaton', lambda: KeywordAutomaton(
+        [keyword for keywords in THEMES.values() for keyword in keywords] +
+        [keyword for genre_data in GENRES.values() for keyword in genre_data["keywords"]] +
+        WAR_SIGNALS + WAR_CONTEXT_SIGNALS))
+
+def get_genre_pattern_engine():
+    """Precompiled genre patterns with per-pattern timings"""
+    return get_legacy_index('genre_patterns', lambda: GenrePatternEngine(GENRES))
+
+def get_rhyme_index():
+    """Rhymes and slant rhymes of every CMU dictionary word, ranked by frequency"""
+    return get_legacy_index('rhymes', build_rhyme_index)
+
+def get_genre_keyword_matrix():
+    """Genre weights of keyword hits (a keyword listed twice counts twice)"""
+    return get_legacy_index('genre_keywords', lambda: build_keyword_matrix(
+        {genre: genre_data["keywords"] for genre, genre_data in GENRES.items()}, count_duplicates=True))
+
+def current_model_version():
+    """Identify the model version and backend producing theme/genre scores"""
+    return f"{ZERO_SHOT_MODEL_VERSION}:{NLI_BACKEND}" if zero_shot_classifier is not None else 'legacy'
+
+def nli_scorer():
+    """The object analysis runs its NLI pairs through: the shared micro-batcher or the classifier itself"""
+    return nli_batcher if NLI_MICROBATCH_WAIT_MS > 0 else zero_shot_classifier
+
+def count_tokens(text):
+    """Count model tokens in text (characters when no model tokenizer is loaded)"""
+    if zero_shot_classifier is None:
+        return len(text)
+    return len(zero_shot_classifier.tokenizer(text, add_special_tokens=False)['input_ids'])
+
+def iter_text_chunks(text):
+    """Lazily yield paragraph/sentence-aligned chunks that fit the model's token budget"""
+    # Chunk boundaries are content-defined, so an edit only changes the chunks around it
+    return iter_chunks(text, CHUNK_MAX_TOKENS, count_tokens, CHUNK_OVERLAP_TOKENS)
+
+@timed_stage('chunking')
+def chunk_text(text):
+    """Split long text into paragraph/sentence-aligned chunks that fit the model's token budget"""
+    return list(iter_text_chunks(text))
+
+def as_analyzed_text(text):
+    """Wrap text in an AnalyzedText; one passed along between stages is reused as is"""
+    return text if isinstance(text, AnalyzedText) else AnalyzedText(text, STOP_WORDS)
+
+def iter_themes_and_genres(text, use_cache=True, chunk_group=None, progress=None):
+    """
+    Analyze themes and genres together: the text is chunked once and all theme and
+    genre hypotheses are scored in shared batched model runs, `chunk_group` chunks
+    at a time (all at once if None). Chunks already scored in a previous request are
+    taken from the chunk cache unless use_cache is False.
+    Yields ('partial', {...}) with the percentages of the chunks scored so far after
+    each group (once, with the legacy scores, without the model), then ('scores',
+    {themes, genres, source}): source is the model version that produced the
+    scores, 'legacy' without the model, or None if the model failed and the legacy
+    scores stand in for it (such results shouldn't be cached).
+    `progress(done, total)` is called as chunks are scored.
+    """
+    text = as_analyzed_text(text)
+    themes = genres = None
+    fallback_reason = 'no_model'
+    source = 'legacy'
+    
+    if zero_shot_classifier is not None:
+        # Read once the classifier is known, so a model finishing its background load
+        # mid-request can't relabel legacy scores (or the reverse)
+        model_version = current_model_version()
+        try:
+            chunks = chunk_text(text.text)
+            group_size = chunk_group or max(1, len(chunks))
+            
+            # Sum of each label's chunk scores divided by the chunk count, accumulated
+            # in the same order as classify_chunks_multi so the result is identical
+            totals = {task: {label: 0.0 for label in labels} for task, (labels, _) in ANALYSIS_TASKS.items()}
+            for start in range(0, len(chunks), group_size):
+                group_progress = None
+                if progress is not None:
+                    def group_progress(done, total, start=start):
+                        progress(start + done, len(chunks))
+                
+                with timed_stage('inference'):
+                    group_scores = score_chunks(nli_scorer(), chunks[start:start + group_size], ANALYSIS_TASKS,
+                                                NLI_BATCH_SIZE, chunk_score_cache if use_cache else None,
+                                                model_version, group_progress)
+                for chunk_scores in group_scores:
+                    for task, scores in chunk_scores.items():
+                        for label, score in scores.items():
+                            totals[task][label] += score / len(chunks)
+                
+                yield 'partial', {
+                    'chunks_done': start + len(group_scores),
+                    'chunks_total': len(chunks),
+                    'themes': score_percentages(totals['themes']),
+                    'genres': score_percentages(totals['genres'])
+                }
+            
+            themes = finalize_theme_scores(text, totals['themes'])
+            genres = finalize_genre_scores(text, totals['genres'])
+            source = model_version
+            
+        except Exception as e:
+            print(f"Error in zero-shot theme/genre analysis: {str(e)}")
+            fallback_reason = 'error'
+            source = None
+    else:
+        print("Zero-shot classifier not available, falling back to keyword and pattern methods")
+    
+    if themes is None:
+        # Fallback to legacy methods without the model or if there's any error
+        LEGACY_FALLBACKS.labels(fallback_reason).inc()
+        themes, genres = analyze_themes_legacy(text), analyze_genres_legacy(text)
+        if progress is not None:
+            progress(1, 1)
+        yield 'partial', {'chunks_done': 1, 'chunks_total': 1, 'themes': themes, 'genres': genres}
+    
+    yield 'scores', {'themes': themes, 'genres': genres, 'source': source}
+
 def analyze_themes(text):
     """Analyze text for themes using zero-shot classification with Hugging Face Transformers"""
+    text = as_analyzed_text(text)
     # Check if the zero-shot classifier is available
     if zero_shot_classifier is None:
         print("Zero-shot classifier not available, falling back to keyword method")
+        LEGACY_FALLBACKS.labels('no_model').inc()
         return analyze_themes_legacy(text)
         
     try:
-        # Prepare theme labels
-        theme_labels = list(THEMES.keys())
-        
-        # If text is very long, split it into chunks to avoid context length issues
-        max_length = 1024  # BART model has a max context length
-        chunks = []
-        
-        if len(text) > max_length:
-            # Split the text into sentences
-            sentences = nltk.sent_tokenize(text)
-            current_chunk = ""
-            
-            for sentence in sentences:
-                if len(current_chunk) + len(sentence) < max_length:
-                    current_chunk += sentence + " "
-                else:
-                    chunks.append(current_chunk.strip())
-                    current_chunk = sentence + " "
-            
-            # Add the last chunk if it's not empty
-            if current_chunk.strip():
-                chunks.append(current_chunk.strip())
-        else:
-            chunks = [text]
-        
-        # Process each chunk and aggregate results
-        theme_scores = {theme: 0.0 for theme in theme_labels}
-        chunk_count = len(chunks)
-        
-        for chunk in chunks:
-            # Use more specific templates for better zero-shot classification
-            hypothesis_templates = [
-                "This text is about {}.",
-                "The theme of this text is {}.",
-                "This passage discusses {}."
-            ]
-            
-            # Run multiple classifications with different templates for more robust results
-            chunk_scores = {theme: 0.0 for theme in theme_labels}
-            
-            for template in hypothesis_templates:
-                result = zero_shot_classifier(
-                    chunk, 
-                    candidate_labels=theme_labels, 
-                    multi_label=True,
-                    hypothesis_template=template
-                )
-                
-                # Aggregate scores from this template
-                for label, score in zip(result['labels'], result['scores']):
-                    chunk_scores[label] += score / len(hypothesis_templates)
-            
-            # Add this chunk's scores to overall scores
-            for theme in theme_labels:
-                theme_scores[theme] += chunk_scores[theme] / chunk_count
+        chunks = chunk_text(text.text)
         
-        # Apply contextual analysis for specific thematic elements in the text
-        lower_text = text.lower()
+        # Score every (chunk, template, theme) pair in batched forward passes and
+        # average the results across templates and chunks
+        with timed_stage('inference'):
+            theme_scores = classify_chunks(nli_scorer(), chunks, list(THEMES.keys()),
+                                           THEME_HYPOTHESIS_TEMPLATES, NLI_BATCH_SIZE,
+                                           chunk_score_cache, current_model_version())
         
-        # Special handling for war-themed texts - implemented directly in the main model
-        if "War/Conflict" in theme_scores:
-            # War signals that may be missed by the model
-            war_signals = ["war", "battle", "soldier", "guns", "poppies", "flanders", "crosses", 
-                         "quarrel", "torch", "artillery", "trench", "bomb", "army", "military", 
-                         "combat", "warrior", "enemy", "battlefield", "regiment", "battalion"]
-            
-            # Count significant war signals
-            war_signal_count = sum(1 for signal in war_signals if signal in lower_text)
-            
-            # If multiple war signals are found, adjust the model's score appropriately
-            if war_signal_count >= 3:
-                # Significant war content detected, moderately increase score
-                boost_factor = min(0.25, 0.08 * war_signal_count)  # Cap at 25% boost
-                war_score = theme_scores["War/Conflict"]
-                theme_scores["War/Conflict"] = war_score * (1 + boost_factor)
-            
-            # Special case for "In Flanders Fields" and similar poems
-            if ("flanders" in lower_text and "poppies" in lower_text) or ("crosses" in lower_text and "row" in lower_text):
-                # This is almost certainly a war poem - ensure War/Conflict is dominant
-                theme_scores["War/Conflict"] = max(theme_scores["War/Conflict"], 
-                                                 max(score for theme, score in theme_scores.items() 
-                                                     if theme != "War/Conflict") * 1.25)
-                
-                # Adjust Death/Mortality as a secondary theme
-                if "Death/Mortality" in theme_scores:
-                    theme_scores["Death/Mortality"] = max(theme_scores["Death/Mortality"], 
-                                                        theme_scores["War/Conflict"] * 0.75)
-        
-        # Convert scores to percentages
-        total_score = sum(theme_scores.values())
-        theme_percentages = {}
-        
-        if total_score > 0:
-            for theme, score in theme_scores.items():
-                # Convert to percentage and round to nearest integer
-                theme_percentages[theme] = round((score / total_score) * 100)
-        
-        return theme_percentages
+        return finalize_theme_scores(text, theme_scores)
         
     except Exception as e:
         print(f"Error in zero-shot theme analysis: {str(e)}")
         # Fallback to legacy method if there's any error
+        LEGACY_FALLBACKS.labels('error').inc()
         return analyze_themes_legacy(text)
 
+def finalize_theme_scores(text, theme_scores):
+    """Apply contextual war/conflict adjustments to raw model theme scores and convert to percentages"""
+    # Apply contextual analysis for specific thematic elements in the text
+    lower_text = as_analyzed_text(text).lower
+    
+    # Special handling for war-themed texts - implemented directly in the main model
+    if "War/Conflict" in theme_scores:
+        # War signals present in the text, found in one pass
+        signals_found = get_keyword_automaton().present(lower_text)
+        
+        # Count significant war signals
+        war_signal_count = sum(1 for signal in WAR_SIGNALS if signal in signals_found)
+        
+        # If multiple war signals are found, adjust the model's score appropriately
+        if war_signal_count >= 3:
+            # Significant war content detected, moderately increase score
+            boost_factor = min(0.25, 0.08 * war_signal_count)  # Cap at 25% boost
+            war_score = theme_scores["War/Conflict"]
+            theme_scores["War/Conflict"] = war_score * (1 + boost_factor)
+        
+        # Special case for "In Flanders Fields" and similar poems
+        if ("flanders" in signals_found and "poppies" in signals_found) or ("crosses" in signals_found and "row" in signals_found):
+            # This is almost certainly a war poem - ensure War/Conflict is dominant
+            theme_scores["War/Conflict"] = max(theme_scores["War/Conflict"], 
+                                             max(score for theme, score in theme_scores.items() 
+                                                 if theme != "War/Conflict") * 1.25)
+            
+            # Adjust Death/Mortality as a secondary theme
+            if "Death/Mortality" in theme_scores:
+                theme_scores["Death/Mortality"] = max(theme_scores["Death/Mortality"], 
+                                                    theme_scores["War/Conflict"] * 0.75)
+    
+    # Convert scores to percentages
+    total_score = sum(theme_scores.values())
+    theme_percentages = {}
+    
+    if total_score > 0:
+        for theme, score in theme_scores.items():
+            # Convert to percentage and round to nearest integer
+            theme_percentages[theme] = round((score / total_score) * 100)
+    
+    return theme_percentages
+
+@timed_stage('legacy_themes')
 def analyze_themes_legacy(text):
     """Legacy method to analyze text for themes using keyword matching and TF-IDF"""
     # Preprocess the text
-    text = text.lower()
-    tokens = word_tokenize(text)
-    stop_words = set(stopwords.words('english'))
-    filtered_tokens = [w for w in tokens if w.isalnum() and w not in stop_words]
+    document = as_analyzed_text(text)
+    text = document.lower
+    filtered_tokens = document.content_tokens
     
     # Theme scores
     theme_scores = {}
     
+    # Synonym matches per token from the precomputed WordNet index
+    synonym_index = get_theme_synonym_index()
+    token_synonym_matches = [synonym_index.matches(token) for token in filtered_tokens] if synonym_index else []
+    
+    # Direct keyword matches (strong war indicators weigh more) and partial matches with
+    # longer keywords (stemming-like approach), scored over the token counts in one pass
+    keyword_matches = get_theme_keyword_matrix().score(Counter(filtered_tokens))
+    
     # Count theme keyword occurrences with contextual weighting
     for theme, keywords in THEMES.items():
-        # Basic keyword counting
-        keyword_count = 0
-        for token in filtered_tokens:
-            # Direct match
-            if token in keywords:
-                # Give higher weight to war-related terms for more accurate classification
-                if theme == "War/Conflict" and token in ["war", "battle", "soldier", "guns", "poppies", "flanders"]:
-                    keyword_count += 1.5  # Higher weight for strong war indicators
-                else:
-                    keyword_count += 1
-            
-            # Partial match with longer keywords (stemming-like approach)
-            for keyword in keywords:
-                if len(keyword) > 4 and len(token) > 4 and (keyword.startswith(token) or token.startswith(keyword)):
-                    keyword_count += 0.5
+        keyword_count = keyword_matches[theme]
         
-        # Use WordNet to check for synonyms of theme keywords
-        for token in filtered_tokens:
-            for keyword in keywords:
-                try:
-                    # Get synsets for the token and keyword
-                    token_synsets = wordnet.synsets(token)
-                    keyword_synsets = wordnet.synsets(keyword)
-                    
-                    # Check for synonym relationships
-                    if token_synsets and keyword_synsets:
-                        # Check if any synset paths overlap
-                        for t_syn in token_synsets:
-                            for k_syn in keyword_synsets:
-                                # Compute semantic similarity if they're the same part of speech
-                                if t_syn.pos() == k_syn.pos():
-                                    similarity = t_syn.path_similarity(k_syn)
-                                    if similarity and similarity > 0.7:  # High similarity threshold
-                                        keyword_count += 0.7
-                except Exception:
-                    continue  # Skip on any WordNet errors
+        # Use WordNet to check for synonyms of theme keywords (each shared synset adds 0.7).
+        # Added one match at a time, in token order, so the float sum is the same as
+        # comparing every token with every keyword
+        for matches in token_synonym_matches:
+            for _ in range(matches.get(theme, 0)):
+                keyword_count += 0.7
         
         theme_scores[theme] = keyword_count
     
     # Context-based frequency adjustment with special handling for war poems
-    # Words that appear in proximity to theme keywords get a boost
-    text_chunks = [text[i:i+200] for i in range(0, len(text), 100)]  # Overlapping chunks
+    # Words that appear in proximity to theme keywords get a boost. Keywords are found in
+    # one pass and assigned to the overlapping 200-character chunks that contain them
+    chunk_keywords = keyword_windows(get_keyword_automaton().find(text), len(text), 200, 100)
     for theme, keywords in THEMES.items():
-        for chunk in text_chunks:
-            chunk_lower = chunk.lower()
+        keyword_counts = Counter(keywords)
+        for found in chunk_keywords:
+            # Count theme words in this chunk
+            theme_word_count = sum(keyword_counts[keyword] for keyword in found)
+            
             # If chunk contains a theme keyword, boost score for that theme
-            if any(keyword in chunk_lower for keyword in keywords):
-                # Count other theme words in this chunk
-                theme_word_count = sum(1 for keyword in keywords if keyword in chunk_lower)
-                
+            if theme_word_count:
                 # Special handling for war poetry
                 if theme == "War/Conflict":
-                    war_signals = ["flanders", "poppies", "guns", "crosses", "row", "brave", "soldier", "battle", "fought"]
-                    war_signal_count = sum(1 for signal in war_signals if signal in chunk_lower)
+                    war_signal_count = sum(1 for signal in WAR_CONTEXT_SIGNALS if signal in found)
                     
                     if war_signal_count >= 2:
                         # Strong indication of war poetry, apply higher boost
@@ -509,6 +1098,10 @@ def analyze_themes_legacy(text):
             theme_docs = [' '.join(THEMES[theme]) for theme in THEMES]
             all_docs = [text_without_stopwords] + theme_docs
             
+            # scikit-learn is imported on first use to keep server startup fast
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            from sklearn.metrics.pairwise import cosine_similarity
+            
             # Compute TF-IDF with better parameters
             vectorizer = TfidfVectorizer(ngram_range=(1, 2),  # Include bigrams
                                         min_df=2,             # Minimum document frequency
@@ -558,128 +1151,72 @@ def analyze_themes_legacy(text):
 
 def analyze_genres(text):
     """Analyze text to determine probable genres using zero-shot classification"""
+    text = as_analyzed_text(text)
     # Check if the zero-shot classifier is available
     if zero_shot_classifier is None:
         print("Zero-shot classifier not available for genre analysis, falling back to pattern method")
+        LEGACY_FALLBACKS.labels('no_model').inc()
         return analyze_genres_legacy(text)
         
     try:
-        # Prepare genre labels
-        genre_labels = list(GENRES.keys())
+        chunks = chunk_text(text.text)
         
-        # If text is very long, split it into chunks to avoid context length issues
-        max_length = 1024  # BART model has a max context length
-        chunks = []
-        
-        if len(text) > max_length:
-            # Split the text into sentences
-            sentences = nltk.sent_tokenize(text)
-            current_chunk = ""
-            
-            for sentence in sentences:
-                if len(current_chunk) + len(sentence) < max_length:
-                    current_chunk += sentence + " "
-                else:
-                    chunks.append(current_chunk.strip())
-                    current_chunk = sentence + " "
-            
-            # Add the last chunk if it's not empty
-            if current_chunk.strip():
-                chunks.append(current_chunk.strip())
-        else:
-            chunks = [text]
+        # Run zero-shot classification over all chunks, averaging scores across chunks
+        with timed_stage('inference'):
+            genre_scores = classify_chunks(nli_scorer(), chunks, list(GENRES.keys()),
+                                           GENRE_HYPOTHESIS_TEMPLATES, NLI_BATCH_SIZE,
+                                           chunk_score_cache, current_model_version())
         
-        # Process each chunk and aggregate results
-        genre_scores = {genre: 0.0 for genre in genre_labels}
-        chunk_count = len(chunks)
-        
-        for chunk in chunks:
-            # Run zero-shot classification
-            result = zero_shot_classifier(chunk, candidate_labels=genre_labels, multi_label=True)
-            
-            # Aggregate scores
-            for label, score in zip(result['labels'], result['scores']):
-                genre_scores[label] += score / chunk_count  # Average across chunks
-        
-        # Convert scores to percentages
-        total_score = sum(genre_scores.values())
-        genre_percentages = {}
-        
-        if total_score > 0:
-            for genre, score in genre_scores.items():
-                # Convert to percentage and round to nearest integer
-                genre_percentages[genre] = round((score / total_score) * 100)
-        
-        # Apply confidence adjustments - boost the top genre if there's a clear winner
-        genres_sorted = sorted(genre_percentages.items(), key=lambda x: x[1], reverse=True)
-        if len(genres_sorted) >= 2:
-            top_genre, top_score = genres_sorted[0]
-            second_genre, second_score = genres_sorted[1]
-            
-            # If there's a clear winner (more than 20% gap)
-            if top_score - second_score > 20:
-                # Increase confidence in the top genre
-                extra_points = min(10, 100 - top_score)
-                genre_percentages[top_genre] += extra_points
-                
-                # Slightly reduce second place if possible
-                if second_score > 5:
-                    genre_percentages[second_genre] -= min(5, second_score - 5)
-                    
-        # Add structural analysis insights to refine the model's prediction
-        # This combines the best of both worlds: AI model prediction + structural features
-        refined_scores = refine_genre_scores_with_structure(text, genre_percentages)
-        
-        return refined_scores
+        return finalize_genre_scores(text, genre_scores)
         
     except Exception as e:
         print(f"Error in zero-shot genre analysis: {str(e)}")
         # Fallback to legacy method if there's any error
+        LEGACY_FALLBACKS.labels('error').inc()
         return analyze_genres_legacy(text)
 
+def finalize_genre_scores(text, genre_scores):
+    """Convert raw model genre scores to percentages and refine them with structural analysis"""
+    # Convert scores to percentages
+    total_score = sum(genre_scores.values())
+    genre_percentages = {}
+    
+    if total_score > 0:
+        for genre, score in genre_scores.items():
+            # Convert to percentage and round to nearest integer
+            genre_percentages[genre] = round((score / total_score) * 100)
+    
+    # Apply confidence adjustments - boost the top genre if there's a clear winner
+    genres_sorted = sorted(genre_percentages.items(), key=lambda x: x[1], reverse=True)
+    if len(genres_sorted) >= 2:
+        top_genre, top_score = genres_sorted[0]
+        second_genre, second_score = genres_sorted[1]
+        
+        # If there's a clear winner (more than 20% gap)
+        if top_score - second_score > 20:
+            # Increase confidence in the top genre
+            extra_points = min(10, 100 - top_score)
+            genre_percentages[top_genre] += extra_points
+            
+            # Slightly reduce second place if possible
+            if second_score > 5:
+                genre_percentages[second_genre] -= min(5, second_score - 5)
+                
+    # Add structural analysis insights to refine the model's prediction
+    # This combines the best of both worlds: AI model prediction + structural features
+    refined_scores = refine_genre_scores_with_structure(text, genre_percentages)
+    
+    return refined_scores
+
+@timed_stage('structure')
 def refine_genre_scores_with_structure(text, genre_scores):
     """Refine genre scores with structural analysis of the text"""
-    # Calculate structure features
-    lines = text.split('\n')
-    non_empty_lines = [line for line in lines if line.strip()]
-    
-    # Default values
-    avg_line_length = 0
-    paragraph_count = 1
-    dialogue_ratio = 0
-    quoted_text_ratio = 0
-    technical_elements = 0
-    
-    if non_empty_lines:
-        # Average line length
-        avg_line_length = sum(len(line) for line in non_empty_lines) / len(non_empty_lines)
-        
-        # Number of paragraphs (sequences of lines separated by blank lines)
-        for i in range(1, len(lines)):
-            if not lines[i-1].strip() and lines[i].strip():
-                paragraph_count += 1
-        
-        # Dialogue ratio (lines with quotes / total lines)
-        dialogue_lines = sum(1 for line in non_empty_lines if '"' in line)
-        dialogue_ratio = dialogue_lines / len(non_empty_lines) if non_empty_lines else 0
-        
-        # Quoted text ratio
-        text_length = len(text)
-        quoted_text = 0
-        in_quote = False
-        for char in text:
-            if char == '"':
-                in_quote = not in_quote
-            if in_quote:
-                quoted_text += 1
-        quoted_text_ratio = quoted_text / text_length if text_length > 0 else 0
-        
-        # Technical elements (bullets, numbers, etc.)
-        technical_count = 0
-        for line in non_empty_lines:
-            if re.match(r'^\d+\.', line) or re.match(r'^•', line) or re.match(r'^-', line):
-                technical_count += 1
-        technical_elements = technical_count / len(non_empty_lines) if non_empty_lines else 0
+    # Structure features, shared with the legacy genre scorer
+    document = as_analyzed_text(text)
+    lines = document.lines
+    avg_line_length = document.structure["avg_line_length"]
+    dialogue_ratio = document.structure["dialogue_ratio"]
+    technical_elements = document.structure["technical_elements"]
     
     # Apply structural adjustments to refine the AI predictions
     refined_scores = genre_scores.copy()
@@ -722,104 +1259,67 @@ def refine_genre_scores_with_structure(text, genre_scores):
     
     return refined_scores
 
+@timed_stage('legacy_genres')
 def analyze_genres_legacy(text):
     """Legacy method to analyze text for genres using pattern matching"""
     # Preprocess the text
-    lower_text = text.lower()
+    document = as_analyzed_text(text)
+    lower_text = document.lower
     
     # Genre scores
     genre_scores = {}
     
     # Initial text structure analysis to help genre identification
-    structure_features = {
-        "avg_line_length": 0,
-        "num_paragraphs": 0,
-        "dialogue_ratio": 0,
-        "quoted_text_ratio": 0,
-        "technical_elements": 0,
-        "formatting_elements": 0
-    }
+    structure_features = document.structure
+    lines = document.lines
     
-    # Calculate structure features
-    lines = text.split('\n')
-    non_empty_lines = [line for line in lines if line.strip()]
-    if non_empty_lines:
-        # Average line length
-        structure_features["avg_line_length"] = sum(len(line) for line in non_empty_lines) / len(non_empty_lines)
-        
-        # Number of paragraphs (sequences of lines separated by blank lines)
-        paragraph_count = 1  # Start with 1 for the first paragraph
-        for i in range(1, len(lines)):
-            if not lines[i-1].strip() and lines[i].strip():
-                paragraph_count += 1
-        structure_features["num_paragraphs"] = paragraph_count
-        
-        # Dialogue ratio (lines with quotes / total lines)
-        dialogue_lines = sum(1 for line in non_empty_lines if '"' in line)
-        structure_features["dialogue_ratio"] = dialogue_lines / len(non_empty_lines)
-        
-        # Quoted text ratio
-        text_length = len(text)
-        quoted_text = 0
-        in_quote = False
-        for char in text:
-            if char == '"':
-                in_quote = not in_quote
-            if in_quote:
-                quoted_text += 1
-        structure_features["quoted_text_ratio"] = quoted_text / text_length if text_length > 0 else 0
-        
-        # Technical elements (bullets, numbers, etc.)
-        technical_count = 0
-        for line in non_empty_lines:
-            if re.match(r'^\d+\.', line) or re.match(r'^•', line) or re.match(r'^-', line):
-                technical_count += 1
-        structure_features["technical_elements"] = technical_count / len(non_empty_lines)
-        
-        # Formatting elements (asterisks, underscores for bold/italic, etc.)
-        formatting_count = sum(line.count('*') + line.count('_') + line.count('==') for line in non_empty_lines)
-        structure_features["formatting_elements"] = formatting_count / len(non_empty_lines)
+    # Add more weight for keywords in title-like positions or beginnings of paragraphs;
+    # only these lines carry extra weight, so only they are scanned
+    weighted_lines = []
+    for i, line in enumerate(lines):
+        line_weight = 0
+        # Title position (first few lines)
+        if i < 3:
+            line_weight += 2
+        # Paragraph beginning
+        if i == 0 or not lines[i-1].strip():
+            line_weight += 1.5
+        # Section heading (short line with keyword)
+        if len(line) < 50 and line.strip().endswith(':'):
+            line_weight += 2
+        if line_weight and line.strip():
+            weighted_lines.append((line.lower(), line_weight))
+    
+    # Weighted hits per keyword: every occurrence plus its position weights
+    genre_keyword_matrix = get_genre_keyword_matrix()
+    keyword_hits = {keyword: lower_text.count(keyword) for keyword in genre_keyword_matrix.vocabulary}
+    keyword_automaton = get_keyword_automaton()
+    for line_lower, line_weight in weighted_lines:
+        for keyword in keyword_automaton.present(line_lower):
+            if keyword in keyword_hits:
+                keyword_hits[keyword] += line_weight
+    keyword_counts = genre_keyword_matrix.score(keyword_hits)
+    
+    # Matches of every genre pattern, each distinct pattern counted once
+    pattern_matches = get_genre_pattern_engine().match_counts(document.text)
     
     # Check for keyword matches with weighted scoring
     for genre, genre_data in GENRES.items():
-        # Count keyword occurrences with positional weighting
-        keyword_count = 0
-        for keyword in genre_data["keywords"]:
-            # Simple count
-            occurrences = lower_text.count(keyword)
-            
-            # Add more weight for keywords in title-like positions or beginnings of paragraphs
-            for i, line in enumerate(lines):
-                line_lower = line.lower()
-                
-                # Title position (first few lines)
-                if i < 3 and keyword in line_lower:
-                    keyword_count += 2
-                
-                # Paragraph beginning
-                if (i == 0 or not lines[i-1].strip()) and keyword in line_lower:
-                    keyword_count += 1.5
-                    
-                # Section heading (short line with keyword)
-                if len(line) < 50 and keyword in line_lower and line.strip().endswith(':'):
-                    keyword_count += 2
-            
-            keyword_count += occurrences
+        # Keyword occurrences with positional weighting
+        keyword_count = keyword_counts[genre]
         
         # Check for pattern matches with frequency analysis
         pattern_count = 0
-        for pattern in genre_data["patterns"]:
-            matches = re.findall(pattern, text)
-            
+        for pattern, match_count in pattern_matches[genre]:
             # Apply different weights based on pattern significance
-            if len(matches) > 0:
+            if match_count > 0:
                 # Some patterns are more distinctive than others
                 if "Chapter" in pattern or "Dear" in pattern or "Sincerely" in pattern:
-                    pattern_count += len(matches) * 3  # Very strong indicators
+                    pattern_count += match_count * 3  # Very strong indicators
                 elif "said" in pattern or "asked" in pattern or "dialogue" in pattern:
-                    pattern_count += len(matches) * 0.5  # Common but less distinctive
+                    pattern_count += match_count * 0.5  # Common but less distinctive
                 else:
-                    pattern_count += len(matches)
+                    pattern_count += match_count
         
         # Calculate score with weighted components
         base_score = (keyword_count * 2) + (pattern_count * 3)
@@ -893,40 +1393,37 @@ def analyze_genres_legacy(text):
     
     return genre_scores
 
+@timed_stage('keywords')
 def extract_keywords(text):
     """Extract important keywords from the text using advanced NLP techniques"""
-    # Preprocess the text
-    text = text.lower()
-    
-    # Basic tokenization for initial processing
-    tokens = word_tokenize(text)
-    stop_words = set(stopwords.words('english'))
+    # Sentences of the lowercase text are tokenized once per document and shared by
+    # the tagger, the stopword filter and TF-IDF
+    document = as_analyzed_text(text)
+    sentence_tokens = document.sentence_tokens
+    sentences = document.lower_sentences
+    stop_words = document.stop_words
     
     # More sophisticated filtering
     # Keep words that are longer than 3 chars and not stopwords
-    filtered_tokens = [w for w in tokens if w.isalnum() and w not in stop_words and len(w) > 3]
+    filtered_tokens = [w for w in document.content_tokens if len(w) > 3]
     
-    # Extract proper nouns as potential important entities
+    # Extract proper nouns as potential important entities, tagging all sentences in one call
     proper_nouns = []
-    sentences = nltk.sent_tokenize(text)
-    
-    for sentence in sentences:
-        # Tag parts of speech
-        try:
-            word_tokens = nltk.word_tokenize(sentence)
-            pos_tags = nltk.pos_tag(word_tokens)
-            
+    try:
+        for pos_tags in nltk.pos_tag_sents(sentence_tokens):
             # Extract proper nouns (NNP, NNPS)
             for word, tag in pos_tags:
                 if tag in ['NNP', 'NNPS'] and len(word) > 2 and word.lower() not in stop_words:
                     proper_nouns.append(word)
-        except Exception as e:
-            print(f"Error in POS tagging: {str(e)}")
+    except Exception as e:
+        print(f"Error in POS tagging: {str(e)}")
     
     # Use TF-IDF for term importance with n-gram support
     try:
         # Prepare sentences for TF-IDF
         if len(sentences) > 2:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            
             # Create TF-IDF vectorizer with n-grams
             vectorizer = TfidfVectorizer(
                 max_features=30,           # Extract more features initially
@@ -953,28 +1450,28 @@ def extract_keywords(text):
             # Get top keywords from TF-IDF
             tfidf_keywords = [word for word, score in word_scores[:15]]
             
+            # Base score of every term from TF-IDF
+            term_scores = dict(word_scores)
+            
             # Add contextual relevance - check if keywords appear near theme words
-            enhanced_keywords = []
-            theme_all_keywords = []
-            for theme_keywords in THEMES.values():
-                theme_all_keywords.extend(theme_keywords)
+            theme_all_keywords = Counter(keyword for theme_keywords in THEMES.values() for keyword in theme_keywords)
             
-            for keyword in tfidf_keywords:
-                # Base score from TF-IDF
-                keyword_score = dict(word_scores)[keyword] if keyword in dict(word_scores) else 0
-                
-                # Check proximity to theme words for contextual relevance
-                context_bonus = 0
-                for i, sent in enumerate(sentences):
-                    if keyword in sent.lower():
-                        # Check if any theme words are in this sentence
-                        theme_words_in_sent = sum(1 for tw in theme_all_keywords if tw in sent.lower())
-                        if theme_words_in_sent > 0:
-                            context_bonus += 0.5 * theme_words_in_sent
-                
-                # Apply context bonus
-                enhanced_score = keyword_score * (1 + context_bonus)
-                enhanced_keywords.append((keyword, enhanced_score))
+            # Theme words in each sentence, found in one pass per sentence
+            keyword_automaton = get_keyword_automaton()
+            sentence_theme_words = np.array([sum(theme_all_keywords[keyword] for keyword in keyword_automaton.present(sent))
+                                             for sent in sentences], dtype=float)
+            
+            # Keyword-to-sentence index: row i marks the sentences that contain tfidf_keywords[i]
+            keyword_sentences = np.array([[keyword in sent for sent in sentences] for keyword in tfidf_keywords],
+                                         dtype=float).reshape(len(tfidf_keywords), len(sentences))
+            
+            # Each keyword gets 0.5 per theme word in every sentence it appears in (sums of
+            # halves are exact, so the matrix product matches summing sentence by sentence)
+            context_bonuses = 0.5 * (keyword_sentences @ sentence_theme_words)
+            
+            # Apply context bonus
+            enhanced_keywords = [(keyword, term_scores.get(keyword, 0) * (1 + context_bonus))
+                                 for keyword, context_bonus in zip(tfidf_keywords, context_bonuses.tolist())]
             
             # Sort by enhanced score
             enhanced_keywords.sort(key=lambda x: x[1], reverse=True)
@@ -984,8 +1481,9 @@ def extract_keywords(text):
             
             # Add important proper nouns that weren't already captured
             proper_noun_counts = {}
+            lowered_keywords = {k.lower() for k in keywords}
             for noun in proper_nouns:
-                if noun.lower() not in [k.lower() for k in keywords]:
+                if noun.lower() not in lowered_keywords:
                     proper_noun_counts[noun] = proper_noun_counts.get(noun, 0) + 1
             
             # Get most frequent proper nouns
@@ -1019,7 +1517,6 @@ def extract_keywords(text):
         top_bigrams = []
     
     # Combine with most frequent unigrams
-    from collections import Counter
     word_freq = Counter(filtered_tokens)
     unigrams = [word for word, freq in word_freq.most_common(10)]
     
@@ -1052,11 +1549,10 @@ def get_definition():
         })
     
     try:
-        # Call the Dictionary API
-        response = requests.get(f"{DICTIONARY_API_URL}{word}")
+        # Look the word up in the Dictionary API (cached, and bounded by the lookup deadline)
+        status, data = definition_provider.lookup(word)
         
-        if response.status_code == 200:
-            data = response.json()
+        if status == FOUND:
             
             # Format the response
             definitions = []
@@ -1111,7 +1607,7 @@ def get_definition():
             
             return jsonify(result)
         else:
-            # Fallback to WordNet if the API fails
+            # Fallback to WordNet if the API fails, is too slow or doesn't know the word
             definitions = []
             for synset in wordnet.synsets(word)[:3]:  # Limit to 3 definitions
                 definitions.append({
@@ -1231,9 +1727,12 @@ def process_formatting(text, source_type):
         
         return formatted_text, format_data
 
+@timed_stage('html_formatting')
 def process_html_formatting(html_text, format_data):
     """Process HTML text to preserve formatting"""
     try:
+        from bs4 import BeautifulSoup
+        
         # Parse HTML
         soup = BeautifulSoup(html_text, 'html.parser')
         
@@ -1368,6 +1867,7 @@ def process_html_formatting(html_text, format_data):
         # Fallback to plaintext processing
         return process_formatting(html.unescape(html_text), 'plaintext')
 
+@timed_stage('rtf_formatting')
 def process_rtf_formatting(rtf_text, format_data):
     """Process RTF text to preserve formatting (simplified version)"""
     # This is a simplified implementation - a full RTF parser would be more complex
@@ -1404,6 +1904,17 @@ def process_rtf_formatting(rtf_text, format_data):
         # Fallback to plaintext
         return process_formatting(rtf_text, 'plaintext')
 
+def warm_up(timeout=None):
+    """Wait until the lexicons and the model are loaded (e.g. in a pre-fork master before forking)"""
+    if not startup_done.wait(timeout):
+        print("Timed out waiting for the NLP server to finish loading")
+
+# Start loading the lexicons and the model now that everything they use is defined
+if NLI_MODEL_LOADING == 'eager':
+    load_startup_components()
+else:
+    threading.Thread(target=load_startup_components, name='startup-loader', daemon=True).start()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
     print(f'Starting NLP server on port {port}...')
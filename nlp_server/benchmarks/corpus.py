@@ -0,0 +1,176 @@
+"""
+Benchmark corpus: public-domain texts from corpus/ and synthetic documents
+generated from a fixed seed, so every run analyzes exactly the same text.
+
+- poem        In Flanders Fields (about 100 words)
+- essay       the Gettysburg Address followed by synthetic expository paragraphs (about 1,500 words)
+- manuscript  a synthetic 50-page novel manuscript: chapters, narration, dialogue, lists (about 15,000 words)
+- html_paste  the manuscript as pasted from a word processor: inline styles, spans, bold/italic runs,
+              lists, a style and a script block
+
+Each document has its plain text (for the analysis functions) and an HTML
+rendering of it (for process_html_formatting).
+"""
+import html
+import os
+import random
+from collections import namedtuple
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+SIZES = ('poem', 'essay', 'manuscript', 'html_paste')
+
+Document = namedtuple('Document', ['name', 'text', 'html'])
+
+NAMES = ["Anna", "Thomas", "Margaret", "Elias", "Clara", "Samuel", "Ruth", "Daniel", "Helen", "Jonah"]
+PLACES = ["the river", "the old mill", "the harbour", "the chapel", "the orchard", "the station",
+          "the trenches", "the library", "the hill above the town", "the kitchen"]
+NOUNS = ["letter", "lamp", "garden", "storm", "promise", "photograph", "bridge", "soldier", "prayer",
+         "memory", "window", "field", "clock", "dream", "machine", "border", "song", "grave", "horizon", "map"]
+ABSTRACTS = ["love", "grief", "freedom", "faith", "time", "hope", "memory", "war", "identity", "nature",
+             "justice", "loss", "courage", "change", "belief", "imagination", "duty", "silence"]
+VERBS_PAST = ["walked to", "waited by", "looked toward", "ran from", "remembered", "wrote about",
+              "prayed for", "dreamed of", "returned to", "listened at"]
+VERBS_PRESENT = ["shapes", "reveals", "challenges", "sustains", "transforms", "complicates", "defines", "outlasts"]
+ADVERBS = ["quietly", "slowly", "suddenly", "bravely", "softly", "again", "at last", "without a word"]
+TIMES = ["at dawn", "before the war", "in the long winter", "after the funeral", "every Sunday",
+         "as the sun set", "in the spring", "late that night"]
+UTTERANCES = ["I never meant to leave", "We have to go before the guns start", "Do you still believe in it",
+              "The letter came this morning", "Tell me what you saw", "I love you, even now",
+              "Nothing will be the same", "Let the river take it", "Promise me you will come back",
+              "It was only a dream"]
+SAID = ["said", "whispered", "asked", "answered", "shouted", "murmured"]
+CLAUSES = ["because every generation must decide it again", "although few people notice it at first",
+           "when the old certainties fall away", "as history repeatedly shows",
+           "in ways that statistics cannot capture", "even in times of peace and plenty"]
+
+
+def read_corpus_file(filename):
+    with open(os.path.join(CORPUS_DIR, filename), encoding='utf-8') as f:
+        return f.read().strip()
+
+
+def narration(rng):
+    name, place = rng.choice(NAMES), rng.choice(PLACES)
+    return rng.choice([
+        f"{name} {rng.choice(VERBS_PAST)} {place} {rng.choice(TIMES)}.",
+        f"The {rng.choice(NOUNS)} in {place} reminded {name} of {rng.choice(ABSTRACTS)}.",
+        f"{rng.choice(TIMES).capitalize()}, {name} {rng.choice(VERBS_PAST)} the {rng.choice(NOUNS)} {rng.choice(ADVERBS)}.",
+        f"Nobody in {place} spoke of the {rng.choice(NOUNS)}, and {name} did not ask."
+    ])
+
+
+def dialogue(rng):
+    return f"\"{rng.choice(UTTERANCES)},\" {rng.choice(NAMES)} {rng.choice(SAID)} {rng.choice(ADVERBS)}."
+
+
+def exposition(rng):
+    return rng.choice([
+        f"The idea of {rng.choice(ABSTRACTS)} {rng.choice(VERBS_PRESENT)} how we think about "
+        f"{rng.choice(ABSTRACTS)}, {rng.choice(CLAUSES)}.",
+        f"Consider the {rng.choice(NOUNS)}: it {rng.choice(VERBS_PRESENT)} our sense of {rng.choice(ABSTRACTS)}.",
+        f"Critics have argued that {rng.choice(ABSTRACTS)} {rng.choice(VERBS_PRESENT)} {rng.choice(ABSTRACTS)} "
+        f"{rng.choice(CLAUSES)}.",
+        f"In this essay I argue that {rng.choice(ABSTRACTS)} and {rng.choice(ABSTRACTS)} cannot be separated."
+    ])
+
+
+def paragraph(rng, sentence, min_sentences, max_sentences):
+    return ' '.join(sentence(rng) for _ in range(rng.randint(min_sentences, max_sentences)))
+
+
+def word_count(text):
+    return len(text.split())
+
+
+def build_essay(rng, target_words=1500):
+    paragraphs = ["On Remembrance", read_corpus_file('gettysburg_address.txt')]
+    words = sum(word_count(para) for para in paragraphs)
+    while words < target_words:
+        paragraphs.append(paragraph(rng, exposition, 4, 8))
+        words += word_count(paragraphs[-1])
+    return '\n\n'.join(paragraphs)
+
+
+def build_manuscript(rng, target_words=15000, chapters=10):
+    paragraphs = ["THE LONG WINTER", read_corpus_file('sonnet_18.txt')]
+    for chapter in range(1, chapters + 1):
+        paragraphs.append(f"Chapter {chapter}")
+        words = 0
+        while words < target_words // chapters:
+            kind = rng.random()
+            if kind < 0.6:
+                paragraphs.append(paragraph(rng, narration, 3, 9))
+            elif kind < 0.95:
+                paragraphs.append(dialogue(rng))
+            else:
+                items = [f"- {rng.choice(NOUNS)} from {rng.choice(PLACES)}" for _ in range(rng.randint(3, 6))]
+                paragraphs.append('\n'.join(items))
+            words += word_count(paragraphs[-1])
+    return '\n\n'.join(paragraphs)
+
+
+def plain_html(text):
+    """Simple HTML: a <p> per paragraph, <br> between lines, <ul> for dash lists"""
+    blocks = []
+    for para in text.split('\n\n'):
+        lines = para.split('\n')
+        if all(line.startswith('- ') for line in lines):
+            items = ''.join(f"<li>{html.escape(line[2:])}</li>" for line in lines)
+            blocks.append(f"<ul>{items}</ul>")
+        else:
+            blocks.append(f"<p>{'<br>'.join(html.escape(line) for line in lines)}</p>")
+    return '\n'.join(blocks)
+
+
+def pasted_html(text, rng):
+    """Word-processor style HTML: every run wrapped in styled spans, headings, bold/italic, lists"""
+    span = '<span style="font-family:Georgia,serif;font-size:12pt;color:#1a1a1a;">{}</span>'
+    blocks = ['<html><head><meta charset="utf-8">',
+              '<style>p.MsoNormal{margin:0 0 8pt;line-height:115%} .c1{font-weight:700}</style>',
+              '<script>window.__pasteSource = "word";</script></head><body><div class="WordSection1">']
+    for para in text.split('\n\n'):
+        lines = para.split('\n')
+        if para.startswith('Chapter ') or para.isupper():
+            blocks.append(f'<h2 style="text-align:center;">{span.format(html.escape(para))}</h2>')
+        elif all(line.startswith('- ') for line in lines):
+            items = ''.join(f'<li class="MsoListParagraph">{span.format(html.escape(line[2:]))}</li>'
+                            for line in lines)
+            blocks.append(f"<ul>{items}</ul>")
+        else:
+            runs = []
+            for word in ' '.join(lines).split(' '):
+                word = html.escape(word)
+                style = rng.random()
+                if style < 0.03:
+                    word = f"<b>{word}</b>"
+                elif style < 0.06:
+                    word = f"<i>{word}</i>"
+                runs.append(word)
+            # A new styled span every few words, as word processors emit per formatting run
+            spans = [span.format(' '.join(runs[i:i + 7])) for i in range(0, len(runs), 7)]
+            blocks.append(f'<p class="MsoNormal" style="text-align:justify;">{" ".join(spans)}</p>')
+    blocks.append('</div></body></html>')
+    return '\n'.join(blocks)
+
+
+def build_corpus(sizes=SIZES, seed=20240601):
+    """The benchmark documents by size name"""
+    documents = {}
+    for name in sizes:
+        rng = random.Random(f"{seed}:{name}")
+        if name == 'poem':
+            text = read_corpus_file('in_flanders_fields.txt')
+            documents[name] = Document(name, text, plain_html(text))
+        elif name == 'essay':
+            text = build_essay(rng)
+            documents[name] = Document(name, text, plain_html(text))
+        elif name == 'manuscript':
+            text = build_manuscript(rng)
+            documents[name] = Document(name, text, plain_html(text))
+        elif name == 'html_paste':
+            text = build_manuscript(rng)
+            documents[name] = Document(name, text, pasted_html(text, rng))
+        else:
+            raise ValueError(f"Unknown corpus size '{name}' (expected one of {', '.join(SIZES)})")
+    return documents
@@ -0,0 +1,427 @@
+"""
+Benchmark and golden-output check for the text analysis functions.
+
+Times analyze_themes and analyze_genres (with the stub model from stub_model.py),
+analyze_themes_legacy, analyze_genres_legacy, extract_keywords,
+refine_genre_scores_with_structure, process_html_formatting and /get_rhymes
+lookups on each corpus size (see corpus.py), writes the timings to JSON and
+checks them against the budgets and the allowed regression in thresholds.json.
+
+Every function's output is also compared with golden.json, so an optimization
+that changes any score, keyword, rhyme or formatting result is caught. Record it
+from the implementation before the optimizations with --update-golden --revision
+(the stub model stands in for the zero-shot pipeline there too), or from the
+working tree with --update-golden alone.
+
+Usage (from nlp_server/):
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --baseline previous.json --output results.json
+    python benchmarks/run_benchmarks.py --sizes poem essay --functions extract_keywords --repeat 10
+    python benchmarks/run_benchmarks.py --update-golden
+    python benchmarks/run_benchmarks.py --update-golden --revision <commit>
+
+Exits with status 1 if a timing exceeds its threshold or an output differs from golden.
+"""
+import argparse
+import gc
+import hashlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from corpus import SIZES, build_corpus  # noqa: E402
+from stub_model import StubClassifier, StubPipeline  # noqa: E402
+
+GOLDEN_PATH = os.path.join(BENCHMARK_DIR, 'golden.json')
+THRESHOLDS_PATH = os.path.join(BENCHMARK_DIR, 'thresholds.json')
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, 'results', 'latest.json')
+
+FUNCTIONS = ('analyze_themes', 'analyze_genres', 'analyze_themes_legacy', 'analyze_genres_legacy',
+             'extract_keywords', 'refine_genre_scores_with_structure', 'process_html_formatting', 'rhymes')
+
+# Functions that run the NLI model (and need torch, even with the stub model)
+MODEL_FUNCTIONS = ('analyze_themes', 'analyze_genres')
+
+# NLTK data each function's output depends on; a golden output is only comparable
+# where the same packages are present as when it was recorded
+FUNCTION_NLTK_DATA = {
+    'analyze_themes': ['punkt'],
+    'analyze_genres': ['punkt'],
+    'analyze_themes_legacy': ['wordnet', 'stopwords', 'punkt'],
+    'analyze_genres_legacy': [],
+    'extract_keywords': ['stopwords', 'punkt', 'averaged_perceptron_tagger'],
+    'refine_genre_scores_with_structure': [],
+    'process_html_formatting': [],
+    'rhymes': ['wordnet']
+}
+
+# Line-final words of a document looked up by the rhymes function
+RHYME_WORDS = 40
+
+# Golden outputs longer than this (as JSON) are stored as a hash only
+GOLDEN_VALUE_MAX_CHARS = 4000
+
+
+def load_app():
+    """Import the server without loading the real model, and install the stub model"""
+    # Score pairs directly (no micro-batching thread) and keep the model loader idle
+    os.environ.setdefault('NLI_MODEL_LOADING', 'off')
+    os.environ['NLI_MICROBATCH_WAIT_MS'] = '0'
+
+    import app
+    app.warm_up(600)
+    classifier = StubClassifier()
+    app.ZERO_SHOT_MODEL_VERSION = classifier.version
+    app.zero_shot_classifier = classifier
+    rank_rhymes_alphabetically(app)
+    return app
+
+
+def rank_rhymes_alphabetically(app):
+    """
+    Serve rhymes ranked alphabetically, as pronouncing.rhymes() returns them, so the
+    golden rhymes don't depend on whether the Brown corpus is installed
+    """
+    import pronouncing
+    from rhyme_index import RhymeIndex
+
+    if hasattr(app, 'legacy_indexes'):
+        pronouncing.init_cmu()
+        app.legacy_indexes['rhymes'] = RhymeIndex(pronouncing.pronunciations, {})
+
+
+def load_revision_app(revision):
+    """
+    Import nlp_server/app.py as of a git revision (e.g. the commit before an
+    optimization) with the stub model, to record golden outputs from. It reads the
+    same bundled NLTK data as the current server, never downloads, and stays offline.
+    """
+    import importlib
+
+    import nltk
+    from nltk_resources import use_bundled_data
+
+    repository = subprocess.run(['git', 'rev-parse', '--show-toplevel'], cwd=BENCHMARK_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    directory = tempfile.mkdtemp(prefix='nlp_server_revision_')
+    archive = subprocess.run(['git', 'archive', '--format=tar', revision, 'nlp_server'], cwd=repository,
+                             capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(directory)
+    revision_dir = os.path.join(directory, 'nlp_server')
+
+    os.environ.setdefault('NLI_MODEL_LOADING', 'off')
+    os.environ['NLI_MICROBATCH_WAIT_MS'] = '0'
+    os.environ['HF_HUB_OFFLINE'] = os.environ['TRANSFORMERS_OFFLINE'] = '1'
+    use_bundled_data()
+    download = nltk.download
+    nltk.download = lambda *args, **kwargs: False
+    modules_before = set(sys.modules)
+    sys.path.insert(0, revision_dir)
+    try:
+        revision_app = importlib.import_module('app')
+    finally:
+        nltk.download = download
+        sys.path.remove(revision_dir)
+        # Keep the revision's modules out of the way of later imports of the current ones
+        for name in set(sys.modules) - modules_before:
+            if (getattr(sys.modules[name], '__file__', None) or '').startswith(directory):
+                del sys.modules[name]
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if hasattr(revision_app, 'warm_up'):
+        revision_app.warm_up(600)
+    classifier = StubPipeline()
+    revision_app.ZERO_SHOT_MODEL_VERSION = classifier.version
+    revision_app.zero_shot_classifier = classifier
+    rank_rhymes_alphabetically(revision_app)
+    return revision_app
+
+
+def benchmark_calls(app):
+    """Function name -> callable taking a corpus Document"""
+    even_genre_scores = {genre: round(100 / len(app.GENRES)) for genre in app.GENRES}
+    return {
+        'analyze_themes': lambda document: app.analyze_themes(document.text),
+        'analyze_genres': lambda document: app.analyze_genres(document.text),
+        'analyze_themes_legacy': lambda document: app.analyze_themes_legacy(document.text),
+        'analyze_genres_legacy': lambda document: app.analyze_genres_legacy(document.text),
+        'extract_keywords': lambda document: app.extract_keywords(document.text),
+        'refine_genre_scores_with_structure':
+            lambda document: app.refine_genre_scores_with_structure(document.text, dict(even_genre_scores)),
+        'process_html_formatting': lambda document: app.process_html_formatting(
+            document.html, {'paragraphs': [], 'styles': {}, 'lists': [], 'alignment': {}}),
+        'rhymes': lambda document: lookup_rhymes(app, rhyme_words(document.text))
+    }
+
+
+def rhyme_words(text):
+    """Unique line-final words of a text (at most RHYME_WORDS)"""
+    from rhyme_index import WORD
+
+    words = [line_words[-1] for line_words in (WORD.findall(line.lower()) for line in text.split('\n')) if line_words]
+    return list(dict.fromkeys(words))[:RHYME_WORDS]
+
+
+def lookup_rhymes(app, words):
+    """/get_rhymes response of each word"""
+    client = app.app.test_client()
+    return {word: client.get('/get_rhymes', query_string={'word': word}).get_json() for word in words}
+
+
+def nltk_data_status():
+    """
+    {package: True/False} for the NLTK data the analysis functions read, checked by
+    using it (NLTK 3.9 and later read e.g. punkt_tab instead of punkt)
+    """
+    import nltk
+    from nltk.corpus import stopwords, wordnet
+    from nltk_resources import use_bundled_data
+
+    use_bundled_data()
+    checks = {
+        'wordnet': lambda: wordnet.synsets('test'),
+        'stopwords': lambda: stopwords.words('english'),
+        'punkt': lambda: nltk.sent_tokenize("A test. Another test."),
+        'averaged_perceptron_tagger': lambda: nltk.pos_tag(['a', 'test'])
+    }
+    status = {}
+    for package, check in checks.items():
+        try:
+            check()
+            status[package] = True
+        except LookupError:
+            status[package] = False
+    return status
+
+
+def environment(app):
+    """Versions that analysis outputs depend on; golden outputs are only comparable within one environment"""
+    import nltk
+    import sklearn
+    try:
+        import bs4
+        bs4_version = bs4.__version__
+    except ImportError:
+        bs4_version = None
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'nltk': nltk.__version__,
+        'scikit-learn': sklearn.__version__,
+        'beautifulsoup4': bs4_version,
+        'nltk_data': nltk_data_status(),
+        'model': app.ZERO_SHOT_MODEL_VERSION
+    }
+
+
+def run_benchmarks(app, documents, functions, repeat):
+    """Time each function on each document; returns (timings, outputs)"""
+    calls = benchmark_calls(app)
+    timings = {}
+    outputs = {}
+
+    for name, document in documents.items():
+        timings[name] = {
+            'words': len(document.text.split()),
+            'chars': len(document.text),
+            'html_chars': len(document.html),
+            'functions': {}
+        }
+        outputs[name] = {}
+
+        for function in functions:
+            latencies = []
+            for _ in range(repeat + 1):
+                # Cached chunk scores would hide the inference cost
+                app.chunk_score_cache.clear()
+                # As in timeit, garbage left by earlier calls isn't collected on this call's clock
+                gc.collect()
+                gc.disable()
+                try:
+                    start_time = time.perf_counter()
+                    output = calls[function](document)
+                    latencies.append(time.perf_counter() - start_time)
+                finally:
+                    gc.enable()
+
+            # The first call warms up lazily loaded libraries and indexes and isn't counted
+            latencies = latencies[1:]
+            timings[name]['functions'][function] = {
+                'min_ms': round(min(latencies) * 1000, 3),
+                'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 3),
+                'mean_ms': round(float(np.mean(latencies)) * 1000, 3)
+            }
+            outputs[name][function] = output
+            print(f"{name:>11} {function:<36} p50 {timings[name]['functions'][function]['p50_ms']:>10.2f} ms")
+
+    return timings, outputs
+
+
+def record_outputs(app, documents, functions):
+    """Each function's output on each document, without timing"""
+    calls = benchmark_calls(app)
+    outputs = {}
+    for name, document in documents.items():
+        outputs[name] = {}
+        for function in functions:
+            outputs[name][function] = calls[function](document)
+            print(f"{name:>11} {function:<36} recorded")
+    return outputs
+
+
+def update_golden(path, outputs, current_environment, revision=None):
+    """Store the outputs (and the environment they were produced in) as golden"""
+    golden = load_json(path) if os.path.exists(path) else {'outputs': {}}
+    golden['environment'] = current_environment
+    for name, function_outputs in outputs.items():
+        for function, output in function_outputs.items():
+            entry = golden_entry(output)
+            if revision:
+                entry['revision'] = revision
+            golden['outputs'].setdefault(name, {})[function] = entry
+    write_json(path, golden)
+    print(f"Recorded golden outputs in {path}" + (f" from revision {revision}" if revision else ""))
+
+
+def golden_entry(output):
+    """Hash of a function's output, plus the output itself when it is small enough to diff by eye"""
+    canonical = json.dumps(output, sort_keys=True)
+    entry = {'sha256': hashlib.sha256(canonical.encode('utf-8')).hexdigest()}
+    if len(canonical) <= GOLDEN_VALUE_MAX_CHARS:
+        entry['value'] = json.loads(canonical)
+    return entry
+
+
+def check_golden(golden, outputs, current_environment):
+    """List the outputs that differ from the golden ones"""
+    if golden['environment'] != current_environment:
+        print("Warning: golden outputs were recorded in a different environment; differences may not be regressions")
+        for key in sorted(set(golden['environment']) | set(current_environment)):
+            if golden['environment'].get(key) != current_environment.get(key):
+                print(f"  {key}: golden {golden['environment'].get(key)}, now {current_environment.get(key)}")
+
+    mismatches = []
+    for name, function_outputs in outputs.items():
+        for function, output in function_outputs.items():
+            expected = golden['outputs'].get(name, {}).get(function)
+            if expected is None:
+                continue
+            actual = golden_entry(output)
+            if actual['sha256'] != expected['sha256']:
+                mismatch = {'size': name, 'function': function}
+                if 'value' in expected and 'value' in actual:
+                    mismatch.update(expected=expected['value'], actual=actual['value'])
+                mismatches.append(mismatch)
+    return mismatches
+
+
+def check_thresholds(thresholds, timings, baseline=None):
+    """List the timings over their budget or slower than the baseline by more than the allowed regression"""
+    failures = []
+    max_regression = thresholds.get('max_regression', 0.25)
+    min_regression_ms = thresholds.get('min_regression_ms', 1.0)
+
+    for name, result in timings.items():
+        for function, timing in result['functions'].items():
+            p50_ms = timing['p50_ms']
+
+            budget = thresholds.get('budgets_p50_ms', {}).get(name, {}).get(function)
+            if budget is not None and p50_ms > budget:
+                failures.append({'size': name, 'function': function, 'p50_ms': p50_ms, 'budget_ms': budget})
+
+            # Regressions are judged on the fastest call, which is far less noisy than the median
+            previous = (baseline or {}).get(name, {}).get('functions', {}).get(function)
+            if previous is not None:
+                limit = max(previous['min_ms'] * (1 + max_regression), previous['min_ms'] + min_regression_ms)
+                if timing['min_ms'] > limit:
+                    failures.append({'size': name, 'function': function, 'min_ms': timing['min_ms'],
+                                     'baseline_min_ms': previous['min_ms'], 'max_regression': max_regression})
+    return failures
+
+
+def load_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis functions and check their outputs")
+    parser.add_argument('--sizes', nargs='+', choices=SIZES, default=list(SIZES))
+    parser.add_argument('--functions', nargs='+', choices=FUNCTIONS, default=list(FUNCTIONS))
+    parser.add_argument('--repeat', type=int, default=5, help="Timed calls per function and size")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="Where to write the results JSON")
+    parser.add_argument('--baseline', help="Earlier results JSON to check for regressions against")
+    parser.add_argument('--thresholds', default=THRESHOLDS_PATH)
+    parser.add_argument('--golden', default=GOLDEN_PATH)
+    parser.add_argument('--update-golden', action='store_true',
+                        help="Record the current outputs as golden instead of checking them")
+    parser.add_argument('--revision',
+                        help="With --update-golden: record the outputs of app.py as of this git revision "
+                             "(e.g. the commit before an optimization) instead, without timing anything")
+    args = parser.parse_args()
+    if args.revision and not args.update_golden:
+        parser.error("--revision is only used with --update-golden")
+
+    documents = build_corpus(args.sizes)
+    if args.revision:
+        app = load_revision_app(args.revision)
+        outputs = record_outputs(app, documents, args.functions)
+        update_golden(args.golden, outputs, environment(app), args.revision)
+        return 0
+
+    app = load_app()
+    current_environment = environment(app)
+    timings, outputs = run_benchmarks(app, documents, args.functions, args.repeat)
+
+    if args.update_golden:
+        update_golden(args.golden, outputs, current_environment)
+        mismatches = []
+    elif os.path.exists(args.golden):
+        mismatches = check_golden(load_json(args.golden), outputs, current_environment)
+    else:
+        print(f"No golden outputs at {args.golden}; record them on a known-good commit with --update-golden")
+        mismatches = []
+
+    thresholds = load_json(args.thresholds) if os.path.exists(args.thresholds) else {}
+    baseline = load_json(args.baseline)['results'] if args.baseline else None
+    failures = check_thresholds(thresholds, timings, baseline)
+
+    write_json(args.output, {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'environment': current_environment,
+        'repeat': args.repeat,
+        'results': timings,
+        'threshold_failures': failures,
+        'golden_mismatches': mismatches
+    })
+    print(f"Results written to {args.output}")
+
+    for failure in failures:
+        print(f"Threshold exceeded: {json.dumps(failure)}")
+    for mismatch in mismatches:
+        print(f"Output differs from golden: {json.dumps(mismatch)}")
+    return 1 if failures or mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
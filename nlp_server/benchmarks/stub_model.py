@@ -0,0 +1,123 @@
+"""
+Tiny deterministic stand-in for the zero-shot NLI model, so the benchmarks run
+offline and without downloading BART.
+
+StubClassifier exposes the surface nli_engine uses on the real pipeline
+(`tokenizer`, `model`, `model.config.label2id`): the tokenizer hashes words to
+ids and lays out pairs like BART (<s> premise </s></s> hypothesis </s>); the
+model scores entailment by how many hypothesis words occur in the premise, plus
+a fixed per-hypothesis offset. Scores are meaningless but stable, and every
+call runs the real batching, padding and softmax code. StubPipeline wraps the
+same model in the pipeline's call interface, for revisions of app.py that
+called the pipeline.
+"""
+import re
+import zlib
+from functools import lru_cache
+from types import SimpleNamespace
+
+import numpy as np
+
+BOS_ID, PAD_ID, EOS_ID, UNK_ID = 0, 1, 2, 3
+VOCAB_SIZE = 50000
+TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+@lru_cache(maxsize=8192)
+def token_ids(text):
+    """Hashed word ids of a text (cached: each chunk is tokenized once per hypothesis, like a fast tokenizer)"""
+    return tuple(zlib.crc32(token.encode('utf-8')) % (VOCAB_SIZE - 4) + 4 for token in TOKEN.findall(text.lower()))
+
+
+class StubTokenizer:
+    model_max_length = 1024
+
+    def encode_pair(self, premise, hypothesis, add_special_tokens=True, truncation=None):
+        premise_ids = list(token_ids(premise))
+        hypothesis_ids = list(token_ids(hypothesis)) if hypothesis is not None else None
+        if not add_special_tokens:
+            return premise_ids + (hypothesis_ids or [])
+
+        if hypothesis_ids is None:
+            return [BOS_ID] + premise_ids + [EOS_ID]
+        if truncation == 'only_first':
+            premise_ids = premise_ids[:max(0, self.model_max_length - len(hypothesis_ids) - 4)]
+        return [BOS_ID] + premise_ids + [EOS_ID, EOS_ID] + hypothesis_ids + [EOS_ID]
+
+    def __call__(self, text, text_pair=None, add_special_tokens=True, truncation=None, **kwargs):
+        if isinstance(text, str):
+            input_ids = self.encode_pair(text, text_pair, add_special_tokens, truncation)
+            return {'input_ids': input_ids, 'attention_mask': [1] * len(input_ids)}
+
+        pairs = text_pair if text_pair is not None else [None] * len(text)
+        input_ids = [self.encode_pair(premise, hypothesis, add_special_tokens, truncation)
+                     for premise, hypothesis in zip(text, pairs)]
+        return {'input_ids': input_ids, 'attention_mask': [[1] * len(ids) for ids in input_ids]}
+
+    def pad(self, encoded, return_tensors=None):
+        import torch
+
+        length = max(len(ids) for ids in encoded['input_ids'])
+        input_ids = [ids + [PAD_ID] * (length - len(ids)) for ids in encoded['input_ids']]
+        attention_mask = [mask + [0] * (length - len(mask)) for mask in encoded['attention_mask']]
+        return {'input_ids': torch.tensor(input_ids), 'attention_mask': torch.tensor(attention_mask)}
+
+
+class StubModel:
+    config = SimpleNamespace(label2id={'contradiction': 0, 'neutral': 1, 'entailment': 2})
+
+    def __call__(self, input_ids, attention_mask, **kwargs):
+        import torch
+
+        logits = np.zeros((len(input_ids), 3))
+        for row, (ids, mask) in enumerate(zip(input_ids.tolist(), attention_mask.tolist())):
+            ids = ids[:sum(mask)]
+            separator = next(i for i in range(len(ids) - 1) if ids[i] == EOS_ID and ids[i + 1] == EOS_ID)
+            premise, hypothesis = set(ids[1:separator]), ids[separator + 2:-1]
+            overlap = sum(1 for token in hypothesis if token in premise) / max(1, len(hypothesis))
+            offset = zlib.crc32(bytes(str(hypothesis), 'ascii')) % 1000 / 1000
+            logits[row] = [1.0 - overlap, 0.0, 4.0 * overlap + offset - 0.5]
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+
+class StubClassifier:
+    """Classifier-like object with a hashing tokenizer and the stub model"""
+
+    version = 'stub-nli@1'
+
+    def __init__(self):
+        self.tokenizer = StubTokenizer()
+        self.model = StubModel()
+
+
+class StubPipeline(StubClassifier):
+    """
+    The stub model behind the zero-shot-classification pipeline's call interface, for
+    revisions of app.py that called the pipeline directly: one forward pass per
+    hypothesis, scored the way the pipeline scores them
+    """
+
+    def __call__(self, sequence, candidate_labels, hypothesis_template="This example is {}.", multi_label=False):
+        import torch
+
+        entailment_id = next(ind for label, ind in self.model.config.label2id.items()
+                             if label.lower().startswith('entail'))
+        contradiction_id = -1 if entailment_id == 0 else 0
+        logits = []
+        for label in candidate_labels:
+            encoded = self.tokenizer(sequence, hypothesis_template.format(label), truncation='only_first')
+            output = self.model(input_ids=torch.tensor([encoded['input_ids']]),
+                                attention_mask=torch.tensor([encoded['attention_mask']]))
+            logits.append(output.logits.float().numpy()[0])
+        logits = np.array(logits)
+
+        if multi_label:
+            entail_contr_logits = logits[:, [contradiction_id, entailment_id]]
+            scores = (np.exp(entail_contr_logits) / np.exp(entail_contr_logits).sum(-1, keepdims=True))[:, 1]
+        else:
+            entail_logits = logits[:, entailment_id]
+            scores = np.exp(entail_logits) / np.exp(entail_logits).sum()
+
+        order = list(reversed(scores.argsort()))
+        return {'sequence': sequence, 'labels': [candidate_labels[i] for i in order],
+                'scores': scores[order].tolist()}
@@ -0,0 +1,123 @@
+"""
+Edit-stable, token-aware chunking of documents for model inference.
+
+Text is split into paragraphs (and long paragraphs into sentences), then the
+pieces are packed into chunks up to a token budget. Besides cutting when a chunk
+is full, a chunk is also closed after any piece whose content hash marks it as
+an "anchor". Because
+anchors depend only on the piece itself, an edit only changes the chunks between
+the nearest anchors around it, and every other chunk keeps exactly the same text
+(and therefore the same cache key) as before the edit.
+"""
+import hashlib
+import re
+
+import nltk
+
+PARAGRAPH_SEPARATOR = "\n\n"
+SENTENCE_SEPARATOR = " "
+
+
+def split_paragraphs(text):
+    """Split text on blank lines, dropping empty paragraphs"""
+    return [para.strip() for para in re.split(r'\n\s*\n', text) if para.strip()]
+
+
+def is_anchor(piece, anchor_modulus):
+    """A piece is an anchor if its content hash falls in a fixed residue class"""
+    digest = hashlib.md5(piece.encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big') % anchor_modulus == 0
+
+
+def _pieces(text, max_tokens, count_tokens):
+    """Yield (separator, piece, tokens): whole paragraphs, or sentences of long paragraphs"""
+    for paragraph in split_paragraphs(text):
+        paragraph_tokens = count_tokens(paragraph)
+        if paragraph_tokens <= max_tokens:
+            yield PARAGRAPH_SEPARATOR, paragraph, paragraph_tokens
+            continue
+
+        separator = PARAGRAPH_SEPARATOR
+        for sentence in nltk.sent_tokenize(paragraph):
+            yield separator, sentence, count_tokens(sentence)
+            separator = SENTENCE_SEPARATOR
+
+
+def iter_chunks(text, max_tokens=960, count_tokens=len, overlap_tokens=0, anchor_modulus=8):
+    """
+    Lazily yield chunks of at most `max_tokens` (as counted by `count_tokens`) whose
+    boundaries stay put when unrelated parts of the text are edited.
+    Whole paragraphs, or whole sentences of long paragraphs, are packed together;
+    a single sentence longer than the budget becomes its own chunk.
+    With `overlap_tokens`, each chunk starts with the trailing pieces of the
+    previous one, up to that many tokens.
+    """
+    # Short texts fit in one chunk; skip counting for texts that cannot possibly fit
+    if len(text) <= max_tokens or (len(text) <= max_tokens * 16 and count_tokens(text) <= max_tokens):
+        yield text
+        return
+
+    separator_tokens = {
+        PARAGRAPH_SEPARATOR: count_tokens(PARAGRAPH_SEPARATOR),
+        SENTENCE_SEPARATOR: count_tokens(SENTENCE_SEPARATOR)
+    }
+    min_tokens = max_tokens // 2
+    current = []          # (separator, piece, piece_tokens) entries of the open chunk
+    current_tokens = 0
+    has_new_pieces = False
+
+    for separator, piece, piece_tokens in _pieces(text, max_tokens, count_tokens):
+
+        # Close the current chunk if this piece would overflow it
+        if current and current_tokens + separator_tokens[separator] + piece_tokens > max_tokens:
+            if has_new_pieces:
+                yield _join(current)
+                room = max_tokens - piece_tokens - separator_tokens[separator]
+                current, current_tokens = _overlap(current, overlap_tokens, room, separator_tokens)
+                has_new_pieces = False
+            else:
+                # Only carried-over overlap is left and it doesn't fit with this piece
+                current, current_tokens = [], 0
+
+        if current:
+            current_tokens += separator_tokens[separator]
+        current.append((separator, piece, piece_tokens))
+        current_tokens += piece_tokens
+        has_new_pieces = True
+
+        # Content-defined boundary: close the chunk after an anchor piece
+        if current_tokens >= min_tokens and is_anchor(piece, anchor_modulus):
+            yield _join(current)
+            current, current_tokens = _overlap(current, overlap_tokens, max_tokens, separator_tokens)
+            has_new_pieces = False
+
+    # Don't emit a trailing chunk that only repeats overlap from the previous one
+    if has_new_pieces:
+        yield _join(current)
+
+
+def _overlap(pieces, overlap_tokens, room, separator_tokens):
+    """Return the trailing pieces of a closed chunk to carry into the next one, and their token count"""
+    carried = []
+    total = 0
+    limit = min(overlap_tokens, room)
+
+    for entry in reversed(pieces):
+        separator, _, piece_tokens = entry
+        added = piece_tokens + (separator_tokens[separator] if carried else 0)
+        if total + added > limit:
+            break
+        carried.insert(0, entry)
+        total += added
+
+    return carried, total
+
+
+def _join(pieces):
+    """Join (separator, piece, tokens) entries into chunk text, dropping the first separator"""
+    parts = []
+    for separator, piece, _ in pieces:
+        if parts:
+            parts.append(separator)
+        parts.append(piece)
+    return ''.join(parts)
@@ -0,0 +1,154 @@
+"""
+Compare zero-shot models on a local corpus.
+
+Runs analyze_themes and analyze_genres with each model over every .txt/.md file
+in a corpus directory and reports, per model, p50/p95 latency and per-label
+agreement with the first (reference) model.
+
+Usage:
+    python compare_models.py --corpus ./corpus --models bart-large-mnli distilbart-mnli-12-1
+    python compare_models.py --corpus ./corpus --models bart-large-mnli ./models/my-mnli --output report.json
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+
+def load_corpus(corpus_dir):
+    """Read every .txt/.md file in the corpus directory"""
+    corpus = {}
+    for filename in sorted(os.listdir(corpus_dir)):
+        if filename.endswith(('.txt', '.md')):
+            with open(os.path.join(corpus_dir, filename), encoding='utf-8') as f:
+                corpus[filename] = f.read()
+    return corpus
+
+
+def top_labels(scores, top_n):
+    return {label for label, _ in sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_n]}
+
+
+def label_agreement(reference_results, candidate_results, top_n=3):
+    """
+    Per-label agreement between two models' results over the same documents:
+    how often both models agree on whether the label is in the top N, and the
+    mean absolute difference of its percentage score.
+    """
+    labels = sorted({label for result in reference_results for label in result})
+    report = {}
+
+    for label in labels:
+        agreements = []
+        differences = []
+        for reference, candidate in zip(reference_results, candidate_results):
+            agreements.append((label in top_labels(reference, top_n)) == (label in top_labels(candidate, top_n)))
+            differences.append(abs(reference.get(label, 0) - candidate.get(label, 0)))
+        report[label] = {
+            'top_n_agreement': round(sum(agreements) / len(agreements), 3),
+            'mean_abs_diff': round(sum(differences) / len(differences), 2)
+        }
+
+    top1 = [top_labels(reference, 1) == top_labels(candidate, 1)
+            for reference, candidate in zip(reference_results, candidate_results)]
+    return {'top_1_agreement': round(sum(top1) / len(top1), 3), 'labels': report}
+
+
+def latency_summary(latencies):
+    return {
+        'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 1),
+        'p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 1),
+        'mean_ms': round(float(np.mean(latencies)) * 1000, 1)
+    }
+
+
+def run_model(app, model, corpus, backend):
+    """Run theme and genre analysis for every document with one model"""
+    from inference_backends import load_backend
+    from model_registry import NLI_MODEL_DIR, load_classifier, model_version
+
+    classifier = load_classifier(model)
+    version = model_version(model, classifier)
+    onnx_path = os.path.join(NLI_MODEL_DIR, 'onnx', version.replace('@', '-') + '.onnx')
+    app.zero_shot_classifier = load_backend(classifier, backend, onnx_path)
+    app.ZERO_SHOT_MODEL_VERSION = version
+    app.NLI_BACKEND = backend
+
+    results = {'version': version, 'themes': [], 'genres': []}
+    latencies = {'themes': [], 'genres': []}
+
+    # Warm up so one-off initialization doesn't count as latency
+    first_text = next(iter(corpus.values()))
+    app.analyze_themes(first_text)
+
+    for text in corpus.values():
+        for task, analyze in (('themes', app.analyze_themes), ('genres', app.analyze_genres)):
+            start = time.perf_counter()
+            results[task].append(analyze(text))
+            latencies[task].append(time.perf_counter() - start)
+
+    results['latency'] = {task: latency_summary(values) for task, values in latencies.items()}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare zero-shot models on a local corpus")
+    parser.add_argument('--corpus', required=True, help="Directory of .txt/.md documents")
+    parser.add_argument('--models', nargs='+', required=True,
+                        help="Model names or paths; the first one is the reference")
+    parser.add_argument('--backend', default='torch', help="Inference backend for every model")
+    parser.add_argument('--top-n', type=int, default=3, help="Top-N used for per-label agreement")
+    parser.add_argument('--output', help="Write the full report as JSON to this file")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        parser.error(f"No .txt or .md files found in {args.corpus}")
+
+    # Each model is loaded by run_model, so the app must not load one on import
+    os.environ['NLI_MODEL_LOADING'] = 'off'
+    import app
+    from model_registry import resolve_model
+    from result_cache import LRUCache
+
+    # Every run must hit the model, not the chunk cache
+    app.chunk_score_cache = LRUCache(max_entries=0)
+
+    runs = {}
+    for name in args.models:
+        print(f"Running {name} on {len(corpus)} documents...")
+        runs[name] = run_model(app, resolve_model(name), corpus, args.backend)
+
+    reference = args.models[0]
+    report = {'documents': list(corpus.keys()), 'reference': reference, 'models': {}}
+    for name, run in runs.items():
+        report['models'][name] = {
+            'version': run['version'],
+            'latency': run['latency'],
+            'agreement': {
+                task: label_agreement(runs[reference][task], run[task], args.top_n)
+                for task in ('themes', 'genres')
+            }
+        }
+
+    for name, summary in report['models'].items():
+        print(f"\n{name} ({summary['version']})")
+        for task in ('themes', 'genres'):
+            latency = summary['latency'][task]
+            agreement = summary['agreement'][task]
+            print(f"  {task}: p50 {latency['p50_ms']} ms, p95 {latency['p95_ms']} ms, "
+                  f"top-1 agreement {agreement['top_1_agreement']}")
+            for label, stats in agreement['labels'].items():
+                print(f"    {label:<20} top-{args.top_n} agreement {stats['top_n_agreement']:.3f}, "
+                      f"mean |diff| {stats['mean_abs_diff']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
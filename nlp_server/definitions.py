@@ -0,0 +1,180 @@
+"""
+Dictionary API lookups for /get_definition.
+
+- One pooled requests.Session, so repeated lookups reuse the upstream connection
+- Connect/read timeouts on every call, so a slow upstream can't hang a worker
+- A SQLite cache on disk shared by all workers and kept across restarts; words the
+  API doesn't know are cached too (for a shorter time)
+- Hedging: a lookup waits at most `deadline_seconds` for the upstream and is then
+  reported as unavailable so the caller can answer from WordNet right away. The
+  fetch keeps running in the background and fills the cache for the next request.
+- The fetch queue is bounded: at most `max_pending` words are queued or being
+  fetched, further lookups are unavailable at once, and a fetch that hasn't
+  started when its last waiter gives up is dropped.
+
+The upstream is just a base URL (DICTIONARY_API_URL), so tests can point it at a
+local stand-in server.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Lookup outcomes
+FOUND = 'found'
+NOT_FOUND = 'not_found'
+UNAVAILABLE = 'unavailable'
+
+
+class DefinitionCache:
+    """SQLite table of upstream answers: word -> (status, entries, expiry time)"""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with self._connect() as connection:
+                connection.execute('CREATE TABLE IF NOT EXISTS definitions ('
+                                   'word TEXT PRIMARY KEY, status TEXT, entries TEXT, expires_at REAL)')
+            self.enabled = True
+        except (OSError, sqlite3.Error) as e:
+            print(f"Definition cache disabled ({path}): {str(e)}")
+            self.enabled = False
+
+    def _connect(self):
+        # A connection per call: lookups run on request and fetch threads in several workers
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, word):
+        """Return (status, entries), or None if the word isn't cached or has expired"""
+        if not self.enabled:
+            return None
+        try:
+            with self._connect() as connection:
+                row = connection.execute('SELECT status, entries, expires_at FROM definitions WHERE word = ?',
+                                         (word,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading definition cache: {str(e)}")
+            return None
+
+        if row is None or row[2] < time.time():
+            return None
+        return row[0], json.loads(row[1]) if row[1] is not None else None
+
+    def set(self, word, status, entries, ttl_seconds):
+        if not self.enabled:
+            return
+        try:
+            with self._connect() as connection:
+                connection.execute('INSERT OR REPLACE INTO definitions VALUES (?, ?, ?, ?)',
+                                   (word, status, json.dumps(entries) if entries is not None else None,
+                                    time.time() + ttl_seconds))
+        except sqlite3.Error as e:
+            print(f"Error writing definition cache: {str(e)}")
+
+
+class DefinitionProvider:
+    """Cached, time-bounded lookups against a dictionaryapi.dev-style API"""
+
+    def __init__(self, api_url, cache_path, ttl_seconds=7 * 24 * 3600, negative_ttl_seconds=24 * 3600,
+                 connect_timeout=2.0, read_timeout=5.0, deadline_seconds=1.5, max_workers=4, max_pending=32):
+        self.api_url = api_url
+        self.cache = DefinitionCache(cache_path)
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.timeout = (connect_timeout, read_timeout)
+        self.deadline_seconds = deadline_seconds
+        self.max_pending = max_pending
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # Upstream calls run here so a request can stop waiting at the deadline
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='definition-fetch')
+        # word -> future of its fetch, so concurrent lookups of a word share one call,
+        # and word -> number of lookups still waiting for it
+        self._in_flight = {}
+        self._waiters = {}
+        self._lock = threading.Lock()
+        self.counts = {'cache_hits': 0, 'fetched': 0, 'deadline_misses': 0, 'errors': 0, 'queue_full': 0,
+                       'dropped': 0}
+
+    def lookup(self, word):
+        """
+        Return (status, entries): (FOUND, the API's entries), (NOT_FOUND, None) or
+        (UNAVAILABLE, None) if the upstream failed or missed the deadline
+        """
+        cached = self.cache.get(word)
+        if cached is not None:
+            self._count('cache_hits')
+            return cached
+
+        with self._lock:
+            future = self._in_flight.get(word)
+            if future is None:
+                if len(self._in_flight) >= self.max_pending:
+                    # The upstream is already behind; don't queue fetches nobody will wait for
+                    self.counts['queue_full'] += 1
+                    return UNAVAILABLE, None
+                future = self._executor.submit(self._fetch, word)
+                self._in_flight[word] = future
+            self._waiters[word] = self._waiters.get(word, 0) + 1
+
+        try:
+            return future.result(timeout=self.deadline_seconds)
+        except FutureTimeoutError:
+            self._count('deadline_misses')
+            return UNAVAILABLE, None
+        except CancelledError:
+            return UNAVAILABLE, None
+        finally:
+            self._stop_waiting(word, future)
+
+    def _stop_waiting(self, word, future):
+        """Drop the word's fetch if nobody waits for it any more and it hasn't started"""
+        with self._lock:
+            self._waiters[word] -= 1
+            if self._waiters[word] > 0:
+                return
+            del self._waiters[word]
+            if future.cancel():
+                self.counts['dropped'] += 1
+                if self._in_flight.get(word) is future:
+                    del self._in_flight[word]
+
+    def _fetch(self, word):
+        try:
+            response = self.session.get(f"{self.api_url}{word}", timeout=self.timeout)
+            if response.status_code == 200:
+                result = FOUND, response.json()
+                self.cache.set(word, *result, self.ttl_seconds)
+            elif response.status_code == 404:
+                result = NOT_FOUND, None
+                self.cache.set(word, *result, self.negative_ttl_seconds)
+            else:
+                print(f"Dictionary API returned {response.status_code} for '{word}'")
+                result = UNAVAILABLE, None
+            self._count('fetched' if result[0] != UNAVAILABLE else 'errors')
+            return result
+        except (requests.RequestException, ValueError) as e:
+            print(f"Error fetching definition of '{word}': {str(e)}")
+            self._count('errors')
+            return UNAVAILABLE, None
+        finally:
+            with self._lock:
+                self._in_flight.pop(word, None)
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, in_flight=len(self._in_flight), cache_enabled=self.cache.enabled)
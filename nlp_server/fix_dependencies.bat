@@ -13,7 +13,7 @@ pip install -r requirements.txt
 
 echo.
 echo Downloading required NLTK data...
-python -c "import nltk; datasets=['wordnet', 'stopwords', 'punkt', 'averaged_perceptron_tagger', 'brown']; [nltk.download(d) for d in datasets]"
+python nltk_resources.py
 
 echo.
 echo Dependencies fixed! You can now run the NLP server using install_and_run.bat
@@ -0,0 +1,176 @@
+"""
+Precompiled genre patterns for the legacy genre scorer.
+
+Every pattern in GENRES is compiled once and counted the same way as
+len(re.findall(pattern, text)), grouped by how it can be evaluated cheaply:
+
+- anchored:  starts with '^' (no MULTILINE), so it can only match at position 0
+- literal:   no regex syntax, counted with str.count
+- linear:    patterns that backtrack quadratically on long lowercase runs (e.g.
+             the anaphora backreference), replaced by equivalent linear scanners
+- regex:     everything else, one findall per text
+
+A pattern shared by several genres is evaluated once per text, and the time
+spent on each pattern is recorded for /pattern_stats.
+"""
+import re
+import threading
+import time
+
+LOWER_RUN = re.compile(r"[a-z]+")
+# ',' or ';' followed by whitespace and a lowercase word: where both linear scanners can match
+SEPARATOR = re.compile(r"[;,]\s+(?=[a-z])")
+
+# Above this length, overlaps are found with a prefix function instead of slice comparisons
+SHORT_OVERLAP = 64
+
+
+def longest_overlap(suffix_of, prefix_of):
+    """Length of the longest suffix of `suffix_of` that is also a prefix of `prefix_of`"""
+    prefix_of = prefix_of[:len(suffix_of)]
+    if len(prefix_of) <= SHORT_OVERLAP:
+        for length in range(len(prefix_of), 0, -1):
+            if suffix_of.endswith(prefix_of[:length]):
+                return length
+        return 0
+
+    # Knuth-Morris-Pratt prefix function over prefix + separator + suffix
+    combined = prefix_of + '\0' + suffix_of
+    prefix = [0] * len(combined)
+    for i in range(1, len(combined)):
+        k = prefix[i - 1]
+        while k and combined[i] != combined[k]:
+            k = prefix[k - 1]
+        if combined[i] == combined[k]:
+            k += 1
+        prefix[i] = k
+    return prefix[-1]
+
+
+def separated_runs(text):
+    """
+    Yield (run_start, run_end, following) for every lowercase run that is followed by
+    ',' or ';', whitespace and another lowercase run (`following`, a match object)
+    """
+    # Runs are found leftwards from each separator by scanning the reversed text
+    reversed_text = text[::-1]
+    for separator in SEPARATOR.finditer(text):
+        end = separator.start()
+        run = LOWER_RUN.match(reversed_text, len(text) - end)
+        if run:
+            yield end - (run.end() - run.start()), end, LOWER_RUN.match(text, separator.end())
+
+
+def count_repeated_words(text):
+    """len(re.findall(r"([a-z]+)[;,]\\s+\\1", text)) in linear time"""
+    count = 0
+    resume = 0
+    for run_start, end, following in separated_runs(text):
+        # The group is the tail of a lowercase run that ends right before ';' or ','
+        start = max(run_start, resume)
+        if start >= end:
+            continue
+
+        # The leftmost match has the longest group that the next word starts with
+        length = longest_overlap(text[start:end], following.group())
+        if length:
+            count += 1
+            resume = following.start() + length
+    return count
+
+
+def count_parallel_ing(text):
+    """len(re.findall(r"[a-z]+ing[,;]\\s+[a-z]+ing", text)) in linear time"""
+    count = 0
+    resume = 0
+    for run_start, end, following in separated_runs(text):
+        # The first word is the tail of a run ending in 'ing', with a letter before it
+        start = max(run_start, resume)
+        if end - start < 4 or not text.endswith('ing', start, end):
+            continue
+
+        # The second word extends to the last 'ing' after its first letter
+        last_ing = text.rfind('ing', following.start() + 1, following.end())
+        if last_ing != -1:
+            count += 1
+            resume = last_ing + 3
+    return count
+
+
+# Patterns that backtrack quadratically on long lowercase runs, with equivalent linear scanners
+LINEAR_SCANNERS = {
+    r"([a-z]+)[;,]\s+\1": count_repeated_words,
+    r"[a-z]+ing[,;]\s+[a-z]+ing": count_parallel_ing
+}
+
+
+class PatternCounter:
+    """Counts the matches of one genre pattern like len(re.findall(pattern, text))"""
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+
+        if pattern in LINEAR_SCANNERS:
+            self.kind = 'linear'
+            self._count = LINEAR_SCANNERS[pattern]
+        elif pattern.startswith('^') and '|' not in pattern:
+            # Without MULTILINE, '^' only matches at the start of the text
+            self.kind = 'anchored'
+            self._count = lambda text: 1 if self.regex.match(text) else 0
+        elif not any(char in pattern for char in '.^$*+?{}[]\\|()'):
+            self.kind = 'literal'
+            self._count = lambda text: text.count(pattern)
+        else:
+            self.kind = 'regex'
+            self._count = lambda text: len(self.regex.findall(text))
+
+    def count(self, text):
+        return self._count(text)
+
+
+class GenrePatternEngine:
+    """Counts every genre's patterns in a text, once per distinct pattern, and records timings"""
+
+    def __init__(self, genres):
+        self.genre_patterns = {genre: list(genre_data["patterns"]) for genre, genre_data in genres.items()}
+        self.counters = {}
+        for patterns in self.genre_patterns.values():
+            for pattern in patterns:
+                if pattern not in self.counters:
+                    self.counters[pattern] = PatternCounter(pattern)
+
+        self._stats = {pattern: {'kind': counter.kind, 'calls': 0, 'matches': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+                       for pattern, counter in self.counters.items()}
+        self._lock = threading.Lock()
+
+    def match_counts(self, text):
+        """Return {genre: [(pattern, match count), ...]} in GENRES order"""
+        counts = {}
+        timings = {}
+        for pattern, counter in self.counters.items():
+            start_time = time.perf_counter()
+            counts[pattern] = counter.count(text)
+            timings[pattern] = (time.perf_counter() - start_time) * 1000
+
+        with self._lock:
+            for pattern, elapsed_ms in timings.items():
+                stats = self._stats[pattern]
+                stats['calls'] += 1
+                stats['matches'] += counts[pattern]
+                stats['total_ms'] += elapsed_ms
+                stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+        return {genre: [(pattern, counts[pattern]) for pattern in patterns]
+                for genre, patterns in self.genre_patterns.items()}
+
+    def stats(self):
+        """Per-pattern kind, calls, matches and total/mean/max match time in milliseconds"""
+        with self._lock:
+            return {
+                pattern: dict(stats,
+                              total_ms=round(stats['total_ms'], 3),
+                              mean_ms=round(stats['total_ms'] / stats['calls'], 3) if stats['calls'] else 0.0,
+                              max_ms=round(stats['max_ms'], 3))
+                for pattern, stats in self._stats.items()
+            }
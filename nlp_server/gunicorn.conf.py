@@ -0,0 +1,70 @@
+"""
+Gunicorn configuration for production serving of the NLP server.
+
+The app (zero-shot model, NLTK data, lookup tables) is loaded once in the master
+process and workers are forked from it, so they share the model weights
+copy-on-write instead of each loading their own copy. Start it with
+`python serve.py start`; see serve.py for reload and stop.
+"""
+import gc
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+
+# Worker processes and request threads per worker
+workers = int(os.environ.get('NLP_WORKERS', max(1, multiprocessing.cpu_count() // 2)))
+worker_class = 'gthread'
+threads = int(os.environ.get('NLP_WORKER_THREADS', 4))
+
+# Load the app (and the model) in the master before forking workers
+preload_app = True
+
+# Long documents can take a while on CPU
+timeout = int(os.environ.get('NLP_WORKER_TIMEOUT', 300))
+graceful_timeout = int(os.environ.get('NLP_GRACEFUL_TIMEOUT', 120))
+
+# Every worker writes its metrics to files here, and /metrics adds them up. It must be
+# set before prometheus_client is imported, i.e. before the app is loaded. The default
+# directory is emptied when the master starts (not on reloads, which keep the variable)
+if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = os.path.join(tempfile.gettempdir(), 'nlp_server_metrics')
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+pidfile = os.environ.get('NLP_PIDFILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nlp_server.pid'))
+
+
+def when_ready(server):
+    """Finish loading shared state in the master, then freeze it before any fork"""
+    import app
+    app.warm_up()
+
+    # Move everything allocated so far out of the garbage collector's reach, so
+    # collections in the workers don't write to (and un-share) the master's pages
+    gc.freeze()
+    server.log.info("Shared state loaded; forking %s workers", workers)
+
+
+def post_fork(server, worker):
+    """Give each worker an equal share of the cores for torch's intra-op thread pool"""
+    try:
+        import torch
+    except ImportError:
+        # e.g. ONNX Runtime deployments, or NLI_MODEL_LOADING=off without torch installed
+        return
+
+    torch_threads = max(1, multiprocessing.cpu_count() // workers)
+    torch.set_num_threads(torch_threads)
+    server.log.info("Worker %s using %s torch threads", worker.pid, torch_threads)
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of a worker that exited"""
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+    except ImportError:
+        pass
@@ -0,0 +1,151 @@
+"""
+CPU inference backends for the zero-shot NLI model.
+
+Every backend returns a classifier-like object exposing `tokenizer` and `model`,
+where `model(input_ids=..., attention_mask=...)` returns an object with `.logits`
+and `model.config.label2id` is available - the same surface nli_engine uses on
+the stock transformers pipeline.
+
+- torch:      the fp32 pipeline model as loaded (default)
+- torch-int8: Linear layers dynamically quantized to int8
+- onnx:       the model exported to ONNX and run with ONNX Runtime
+"""
+import inspect
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+from nli_engine import score_pairs
+
+BACKENDS = ('torch', 'torch-int8', 'onnx')
+
+# Fixed sample used by the startup self-check to compare a backend against fp32
+SELF_CHECK_PREMISES = [
+    "In Flanders fields the poppies blow between the crosses, row on row.",
+    "Dear Sir, I am writing to confirm the details of our meeting next week. Sincerely, Ann",
+    "The results of the experiment support the hypothesis that sleep improves memory.",
+    "She laughed and ran down to the river, where the old boat was waiting in the reeds."
+]
+SELF_CHECK_LABELS = ["War/Conflict", "Love", "Nature", "Science", "Poetry", "Letter"]
+
+
+class OnnxSequenceClassifier:
+    """Stand-in for a transformers sequence classification model, backed by ONNX Runtime"""
+
+    def __init__(self, session, config):
+        self.session = session
+        self.config = config
+
+    def __call__(self, input_ids, attention_mask, **kwargs):
+        logits = self.session.run(['logits'], {
+            'input_ids': input_ids.numpy().astype(np.int64),
+            'attention_mask': attention_mask.numpy().astype(np.int64)
+        })[0]
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Wraps a sequence classification model so tracing sees a plain logits tensor output"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, use_cache=False).logits
+
+
+def quantize_int8(classifier):
+    """Dynamically quantize the model's Linear layers to int8"""
+    quantized_model = torch.quantization.quantize_dynamic(
+        classifier.model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    return SimpleNamespace(tokenizer=classifier.tokenizer, model=quantized_model)
+
+
+def export_onnx(classifier, onnx_path):
+    """Export the model's input_ids/attention_mask -> logits graph to an ONNX file"""
+    os.makedirs(os.path.dirname(os.path.abspath(onnx_path)), exist_ok=True)
+    sample = classifier.tokenizer(SELF_CHECK_PREMISES[0], "This text is about war.", return_tensors='pt')
+
+    export_kwargs = {}
+    # Newer torch releases default to the dynamo exporter; the tracing exporter handles BART fine
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs['dynamo'] = False
+
+    with torch.no_grad():
+        torch.onnx.export(
+            _LogitsOnly(classifier.model).eval(),
+            (sample['input_ids'], sample['attention_mask']),
+            onnx_path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['logits'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'logits': {0: 'batch'}
+            },
+            opset_version=14,
+            **export_kwargs
+        )
+
+
+def load_onnx(classifier, onnx_path):
+    """Run the model with ONNX Runtime, exporting it first if no graph exists at onnx_path"""
+    import onnxruntime
+
+    if not os.path.exists(onnx_path):
+        print(f"Exporting zero-shot model to ONNX at {onnx_path}...")
+        export_onnx(classifier, onnx_path)
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = torch.get_num_threads()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = onnxruntime.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+
+    return SimpleNamespace(tokenizer=classifier.tokenizer,
+                           model=OnnxSequenceClassifier(session, classifier.model.config))
+
+
+def load_backend(classifier, backend, onnx_path):
+    """Return `classifier` running on the requested backend"""
+    if backend == 'torch':
+        return classifier
+    if backend == 'torch-int8':
+        return quantize_int8(classifier)
+    if backend == 'onnx':
+        return load_onnx(classifier, onnx_path)
+    raise ValueError(f"Unknown inference backend '{backend}', expected one of {', '.join(BACKENDS)}")
+
+
+def self_check(reference, candidate, batch_size=16):
+    """
+    Score a fixed sample with the fp32 reference and a candidate backend.
+    Returns latency of each and the largest absolute entailment score difference.
+    """
+    pairs = [(premise, f"This text is about {label}.")
+             for premise in SELF_CHECK_PREMISES
+             for label in SELF_CHECK_LABELS]
+
+    # Warm up both backends so one-off initialization doesn't count as latency
+    score_pairs(reference, pairs[:1], batch_size)
+    score_pairs(candidate, pairs[:1], batch_size)
+
+    start = time.perf_counter()
+    reference_scores = score_pairs(reference, pairs, batch_size)
+    reference_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    candidate_scores = score_pairs(candidate, pairs, batch_size)
+    candidate_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        'pairs': len(pairs),
+        'fp32_ms': round(reference_ms, 1),
+        'backend_ms': round(candidate_ms, 1),
+        'speedup': round(reference_ms / candidate_ms, 2) if candidate_ms > 0 else None,
+        'max_score_drift': round(float(np.max(np.abs(reference_scores - candidate_scores))), 4)
+    }
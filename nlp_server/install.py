@@ -13,7 +13,8 @@ def install_requirements():
         "flask-cors==3.0.10",
         "nltk==3.6.2",
         "pronouncing==0.2.0",
-        "requests==2.26.0"
+        "requests==2.26.0",
+        "prometheus-client==0.11.0"
     ]
     
     print("\nInstalling core dependencies...")
@@ -67,18 +68,17 @@ def install_requirements():
         except subprocess.CalledProcessError:
             print("Warning: Failed to install PyTorch. Zero-shot classification will not be available.")
 
-    # Download NLTK data
+    # Download NLTK data into the server's bundled data directory
     print("\nDownloading NLTK data...")
     try:
-        import nltk
-        for dataset in ['wordnet', 'stopwords', 'punkt', 'averaged_perceptron_tagger', 'brown']:
-            try:
-                print(f"Downloading NLTK dataset: {dataset}")
-                nltk.download(dataset, quiet=True)
-            except Exception as e:
-                print(f"Warning: Failed to download NLTK dataset {dataset}: {str(e)}")
+        from nltk_resources import NLTK_DATA_DIR, download_resources
+        failed = download_resources()
+        if failed:
+            print(f"Warning: Failed to download NLTK datasets: {', '.join(failed)}")
+        else:
+            print(f"NLTK data installed in {NLTK_DATA_DIR}")
     except ImportError:
-        print("Warning: Failed to import NLTK. Please install NLTK manually and download required datasets.")
+        print("Warning: Failed to import NLTK. Please install NLTK manually and run 'python nltk_resources.py'.")
 
     print("\nInstallation completed with best-effort approach.")
     print("Some components may be missing if they failed to install.")
@@ -0,0 +1,176 @@
+"""
+Background analysis jobs.
+
+Long analyses run on a bounded thread pool instead of holding an HTTP request
+open. Each job records its status, progress and result until it expires, or
+until it is among the oldest once more than max_finished jobs have finished.
+
+Job state lives in a SQLite file, so under gunicorn a job submitted to one
+worker can be polled through any other worker on the same host. A job runs in
+the worker that accepted it; if that worker exits first, the job is reported as
+failed.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+COLUMNS = ('job_id', 'status', 'progress', 'created_at', 'started_at', 'finished_at', 'result', 'error', 'pid')
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already queued or running"""
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user
+        return True
+    return True
+
+
+class JobManager:
+    """Runs jobs on a bounded executor and keeps their state in a SQLite file until they expire"""
+
+    def __init__(self, path, max_workers=2, max_pending=32, ttl_seconds=600, max_finished=256):
+        self.path = path
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+        # Progress of the jobs running in this process, merged before each write
+        self._progress = {}
+        self._lock = threading.Lock()
+
+        try:
+            self._create_table()
+        except (OSError, sqlite3.Error) as e:
+            # Still shared by the workers on this host
+            self.path = os.path.join(tempfile.gettempdir(), 'nlp_server_jobs.sqlite3')
+            print(f"Job store unavailable ({path}): {str(e)}; using {self.path}")
+            self._create_table()
+
+    def _create_table(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._transaction() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS jobs ('
+                               'job_id TEXT PRIMARY KEY, status TEXT, progress TEXT, created_at REAL, '
+                               'started_at REAL, finished_at REAL, result TEXT, error TEXT, pid INTEGER)')
+        connection = self._connect()
+        try:
+            # Readers in other workers don't block the writer
+            connection.execute('PRAGMA journal_mode=WAL')
+        finally:
+            connection.close()
+
+    def _connect(self):
+        # A connection per call: jobs are read and written from request and job threads in several workers
+        return sqlite3.connect(self.path, timeout=10)
+
+    @contextmanager
+    def _transaction(self):
+        """Connection holding the database's write lock until the block ends"""
+        connection = self._connect()
+        connection.isolation_level = None
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+        finally:
+            connection.close()
+
+    def submit(self, func, *args):
+        """
+        Queue func(*args, progress=callback) and return the new job id.
+        The callback accepts keyword progress fields (e.g. stage, done, total).
+        Raises JobQueueFull when max_pending jobs are queued or running in any worker.
+        """
+        job_id = uuid.uuid4().hex
+        with self._transaction() as connection:
+            self._expire(connection)
+            active = connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+            if active >= self.max_pending:
+                raise JobQueueFull(f"{active} analysis jobs already queued or running")
+
+            connection.execute('INSERT INTO jobs (job_id, status, progress, created_at, pid) VALUES (?, ?, ?, ?, ?)',
+                               (job_id, 'queued', '{}', time.time(), os.getpid()))
+
+        self._executor.submit(self._run, job_id, func, args)
+        return job_id
+
+    def _run(self, job_id, func, args):
+        self._update(job_id, status='running', started_at=time.time())
+        with self._lock:
+            self._progress[job_id] = {}
+
+        def report_progress(**progress):
+            with self._lock:
+                merged = dict(self._progress.get(job_id, {}), **progress)
+                self._progress[job_id] = merged
+            self._update(job_id, progress=json.dumps(merged))
+
+        try:
+            result = func(*args, progress=report_progress)
+            self._update(job_id, status='done', result=json.dumps(result), finished_at=time.time())
+        except Exception as e:
+            print(f"Error in analysis job {job_id}: {str(e)}")
+            self._update(job_id, status='failed', error=str(e), finished_at=time.time())
+        finally:
+            with self._lock:
+                self._progress.pop(job_id, None)
+
+    def _update(self, job_id, **fields):
+        assignments = ', '.join(f"{column} = ?" for column in fields)
+        try:
+            with self._transaction() as connection:
+                connection.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+                if fields.get('finished_at') is not None:
+                    self._expire(connection)
+        except sqlite3.Error as e:
+            print(f"Error updating analysis job {job_id}: {str(e)}")
+
+    def _expire(self, connection):
+        """
+        Fail jobs whose worker has exited, then drop finished jobs older than the
+        TTL and the oldest beyond max_finished (inside a transaction)
+        """
+        now = time.time()
+        for job_id, pid in connection.execute(
+                "SELECT job_id, pid FROM jobs WHERE status IN ('queued', 'running')").fetchall():
+            if pid != os.getpid() and not process_alive(pid):
+                connection.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE job_id = ?",
+                                   ('The worker running this job exited before it finished', now, job_id))
+
+        connection.execute('DELETE FROM jobs WHERE finished_at < ?', (now - self.ttl_seconds,))
+        # Results can be large, so a client submitting many jobs can't keep them all alive
+        connection.execute('DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs WHERE finished_at IS NOT NULL '
+                           'ORDER BY finished_at DESC LIMIT -1 OFFSET ?)', (self.max_finished,))
+
+    def get(self, job_id):
+        """Return the job's state, or None if it is unknown or expired"""
+        with self._transaction() as connection:
+            self._expire(connection)
+            row = connection.execute(f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE job_id = ?",
+                                     (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = dict(zip(COLUMNS, row))
+        del job['pid']
+        job['progress'] = json.loads(job['progress'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
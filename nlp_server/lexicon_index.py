@@ -0,0 +1,268 @@
+"""
+Precomputed keyword indexes for the legacy (non-model) theme and genre analysis.
+
+- KeywordMatrix: a vocabulary x label weight matrix for exact keyword hits and
+  "stemming-like" prefix matches, so a document's label scores are one
+  matrix-vector product over its term counts instead of a token x keyword loop.
+- KeywordAutomaton: an Aho-Corasick automaton that finds every occurrence of a
+  set of keywords in one pass over the text, instead of one substring scan per
+  keyword (per window or sentence).
+- SynonymIndex: the legacy scorer counts a WordNet synonym match whenever a token
+  and a theme keyword share a synset (the only way two synsets clear its 0.7
+  path-similarity threshold). The index maps each WordNet lemma that can match
+  to {theme: number of matches}, built once per taxonomy/WordNet version and
+  stored on disk.
+"""
+import json
+import os
+import threading
+from collections import Counter, defaultdict, deque
+
+import numpy as np
+from nltk.corpus import wordnet
+
+# Directory where built indexes are stored, one file per taxonomy version
+LEXICON_INDEX_DIR = os.environ.get('LEXICON_INDEX_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'indexes'))
+
+# Synonym lookups for tokens that aren't lemmas in the index (e.g. inflected forms)
+SYNONYM_MISS_CACHE_SIZE = 50000
+
+
+class KeywordMatrix:
+    """Term x label weights; a document's label scores are its term counts times the matrix"""
+
+    def __init__(self, labels, vocabulary, matrix, prefix_length=None):
+        self.labels = labels
+        # term -> row of its weights when a token equals the term
+        self.vocabulary = vocabulary
+        # With prefix matching, rows len(vocabulary) + i hold the weights of tokens that
+        # aren't in the vocabulary and whose longest vocabulary prefix is term i
+        self.matrix = matrix
+        self.prefix_length = prefix_length
+
+    def row(self, term):
+        row = self.vocabulary.get(term)
+        if row is not None or self.prefix_length is None:
+            return row
+
+        for end in range(len(term) - 1, self.prefix_length - 1, -1):
+            row = self.vocabulary.get(term[:end])
+            if row is not None:
+                return len(self.vocabulary) + row
+        return None
+
+    def score(self, term_counts):
+        """Return {label: score} for {term: count}"""
+        rows, counts = [], []
+        for term, count in term_counts.items():
+            row = self.row(term)
+            if row is not None:
+                rows.append(row)
+                counts.append(count)
+
+        scores = np.asarray(counts, dtype=float) @ self.matrix[rows] if rows else np.zeros(len(self.labels))
+        return dict(zip(self.labels, scores.tolist()))
+
+
+def build_keyword_matrix(taxonomy, boosts=None, prefix_length=None, count_duplicates=False):
+    """
+    Build a KeywordMatrix for {label: [keywords]}. A token scores, per label:
+    - 1 if it is one of the label's keywords (or boosts[label][token] instead),
+      times the number of times it is listed with count_duplicates,
+    - with prefix_length set, 0.5 for every keyword (duplicates count twice) where
+      both are at least prefix_length long and one is a prefix of the other.
+    """
+    boosts = boosts or {}
+    labels = list(taxonomy)
+
+    # Exact keywords, plus every prefix that a token can share with a long enough keyword
+    vocabulary = {}
+    for keywords in taxonomy.values():
+        for keyword in keywords:
+            vocabulary.setdefault(keyword, len(vocabulary))
+            if prefix_length is not None:
+                for end in range(prefix_length, len(keyword)):
+                    vocabulary.setdefault(keyword[:end], len(vocabulary))
+
+    matrix = np.zeros((2 * len(vocabulary) if prefix_length is not None else len(vocabulary), len(labels)))
+    for column, label in enumerate(labels):
+        keywords = taxonomy[label]
+        listed = Counter(keywords)
+        for term, row in vocabulary.items():
+            if term in listed:
+                matrix[row, column] += boosts.get(label, {}).get(term, 1) * (listed[term] if count_duplicates else 1)
+
+        if prefix_length is None:
+            continue
+
+        long_keywords = Counter(keyword for keyword in keywords if len(keyword) >= prefix_length)
+        for term, row in vocabulary.items():
+            if len(term) < prefix_length:
+                continue
+            # Keywords that start with the term (including the term itself)
+            extended_by = sum(count for keyword, count in long_keywords.items() if keyword.startswith(term))
+            # Keywords the term starts with; longer tokens outside the vocabulary match the same ones
+            prefixes = sum(long_keywords.get(term[:end], 0) for end in range(prefix_length, len(term)))
+            matrix[row, column] += 0.5 * (extended_by + prefixes)
+            matrix[len(vocabulary) + row, column] += 0.5 * (prefixes + long_keywords.get(term, 0))
+
+    return KeywordMatrix(labels, vocabulary, matrix, prefix_length)
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over a set of keywords"""
+
+    def __init__(self, keywords):
+        # Trie of the keywords: per state, its transitions, failure link and the keywords ending there
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for keyword in dict.fromkeys(keywords):
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state] += (keyword,)
+
+        # Failure links point to the longest proper suffix that is also a trie state
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def find(self, text):
+        """Return (start, keyword) for every occurrence, including overlapping and nested ones"""
+        goto, fail, output = self._goto, self._fail, self._output
+        occurrences = []
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for keyword in output[state]:
+                occurrences.append((end - len(keyword), keyword))
+        return occurrences
+
+    def present(self, text):
+        """Return the set of keywords that occur in the text"""
+        return {keyword for _, keyword in self.find(text)}
+
+
+def keyword_windows(occurrences, text_length, size, step):
+    """
+    Sets of keywords that occur entirely inside each window text[i:i + size],
+    for i in range(0, text_length, step), from the automaton's occurrences.
+    """
+    windows = [set() for _ in range(0, text_length, step)]
+    for start, keyword in occurrences:
+        # Windows starting at or before the occurrence and ending at or after its end
+        first = max(0, -(-(start + len(keyword) - size) // step))
+        for window in range(first, start // step + 1):
+            windows[window].add(keyword)
+    return windows
+
+
+class SynonymIndex:
+    """Maps a token to {label: synset matches against the label's keywords}"""
+
+    def __init__(self, synset_labels, weights):
+        # synset name -> {label: number of label keywords having that synset}
+        self.synset_labels = synset_labels
+        # lemma -> {label: matches}, precomputed for every lemma of a keyword synset
+        self.weights = weights
+        self._misses = {}
+        self._lock = threading.Lock()
+
+    def matches(self, token):
+        """Return {label: matches} for a token, the same as comparing it with every keyword"""
+        weights = self.weights.get(token)
+        if weights is not None:
+            return weights
+
+        # Inflected forms reach a lemma through WordNet's morphology, so look them up once
+        weights = self._misses.get(token)
+        if weights is None:
+            weights = synset_matches(token, self.synset_labels)
+            with self._lock:
+                if len(self._misses) >= SYNONYM_MISS_CACHE_SIZE:
+                    self._misses.clear()
+                self._misses[token] = weights
+        return weights
+
+
+def synset_matches(token, synset_labels):
+    """Count, per label, the (token synset, keyword synset) pairs that are the same synset"""
+    counts = Counter()
+    try:
+        for synset in wordnet.synsets(token):
+            for label, count in synset_labels.get(synset.name(), {}).items():
+                counts[label] += count
+    except Exception:
+        pass  # Skip on any WordNet errors
+    return dict(counts)
+
+
+def build_synonym_index(taxonomy):
+    """Build a SynonymIndex for {label: [keywords]} (duplicate keywords count twice)"""
+    synset_labels = defaultdict(Counter)
+    for label, keywords in taxonomy.items():
+        for keyword in keywords:
+            try:
+                for synset in wordnet.synsets(keyword):
+                    synset_labels[synset.name()][label] += 1
+            except Exception:
+                continue
+    synset_labels = {name: dict(labels) for name, labels in synset_labels.items()}
+
+    # Tokens are lowercased and alphanumeric, so only such lemmas can ever be looked up
+    weights = {}
+    for name in synset_labels:
+        for lemma in wordnet.synset(name).lemma_names():
+            lemma = lemma.lower()
+            if lemma.isalnum() and lemma not in weights:
+                weights[lemma] = synset_matches(lemma, synset_labels)
+
+    return SynonymIndex(synset_labels, weights)
+
+
+def load_synonym_index(taxonomy, version, index_dir=LEXICON_INDEX_DIR):
+    """Load the synonym index for a taxonomy version from disk, building and saving it if missing"""
+    version = f"{version}-wn{wordnet.get_version()}"
+    path = os.path.join(index_dir, f"theme_synonyms-{version}.json")
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return SynonymIndex(data['synset_labels'], data['weights'])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    index = build_synonym_index(taxonomy)
+    write_index(path, {'synset_labels': index.synset_labels, 'weights': index.weights})
+    return index
+
+
+def write_index(path, data):
+    """Save an index as JSON (errors are printed, the index still works from memory)"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so concurrent workers never read a partial index
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Error saving index to {path}: {str(e)}")
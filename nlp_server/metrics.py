@@ -0,0 +1,155 @@
+"""
+Prometheus metrics for the NLP server, served in text format by /metrics.
+
+- request counts and latencies per route
+- time spent in each analysis stage (tokenization, chunking, model inference,
+  legacy scoring, structure refinement, keyword extraction)
+- model batch sizes and micro-batch queue depth
+- cache hits and misses, fallbacks to the legacy methods, process RSS
+
+Recording a sample is a lock and an addition, cheap enough to leave on in
+production. Gunicorn workers are separate processes, so gunicorn.conf.py points
+PROMETHEUS_MULTIPROC_DIR at a shared directory and /metrics adds up the samples
+of every worker. Without prometheus_client installed, recording does nothing and
+/metrics is unavailable.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                                   Histogram, generate_latest, multiprocess)
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+# Set (by gunicorn.conf.py) when several worker processes write their samples to files
+MULTIPROCESS_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class NoOpMetric:
+    """Stands in for a metric when prometheus_client isn't installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+if METRICS_AVAILABLE:
+    REQUESTS = Counter('nlp_requests_total', 'HTTP requests by route, method and status code',
+                       ['route', 'method', 'status'])
+    REQUEST_LATENCY = Histogram('nlp_request_duration_seconds',
+                                'Time until the response (or the start of a stream) by route', ['route'],
+                                buckets=LATENCY_BUCKETS)
+    STAGE_LATENCY = Histogram('nlp_stage_duration_seconds', 'Time spent in each analysis stage',
+                              ['stage'], buckets=LATENCY_BUCKETS)
+    MODEL_BATCH_PAIRS = Histogram('nlp_model_batch_pairs', 'Premise/hypothesis pairs per model forward pass',
+                                  buckets=BATCH_BUCKETS)
+    MICROBATCH_PAIRS = Histogram('nlp_microbatch_pairs', 'Pairs per combined micro-batch across concurrent requests',
+                                 buckets=BATCH_BUCKETS)
+    MICROBATCH_QUEUE_DEPTH = Gauge('nlp_microbatch_queue_depth', 'Requests waiting for the next combined model batch',
+                                   multiprocess_mode='livesum')
+    CACHE_HITS = Gauge('nlp_cache_hits', 'Cache hits since the process started', ['cache'],
+                       multiprocess_mode='livesum')
+    CACHE_MISSES = Gauge('nlp_cache_misses', 'Cache misses since the process started', ['cache'],
+                         multiprocess_mode='livesum')
+    LEGACY_FALLBACKS = Counter('nlp_legacy_fallbacks_total', 'Analyses answered by the legacy methods, by reason',
+                               ['reason'])
+    # Live modes: a worker's samples are dropped when it exits (gunicorn.conf.py
+    # child_exit), and the total is added up from the live workers at scrape time
+    RESIDENT_MEMORY = Gauge('nlp_process_resident_memory_bytes', 'Resident memory of each live process',
+                            multiprocess_mode='liveall')
+    TOTAL_RESIDENT_MEMORY = Gauge('nlp_resident_memory_bytes', 'Resident memory of all live processes',
+                                  multiprocess_mode='livesum')
+else:
+    REQUESTS = REQUEST_LATENCY = STAGE_LATENCY = MODEL_BATCH_PAIRS = MICROBATCH_PAIRS = NoOpMetric()
+    MICROBATCH_QUEUE_DEPTH = CACHE_HITS = CACHE_MISSES = LEGACY_FALLBACKS = NoOpMetric()
+    RESIDENT_MEMORY = TOTAL_RESIDENT_MEMORY = NoOpMetric()
+
+
+# Process-level gauges (RSS, cache counters) change slowly, so they are refreshed at
+# most this often instead of on every request
+GAUGE_REFRESH_SECONDS = 1.0
+gauges_refreshed_at = 0.0
+
+
+def gauges_due():
+    """True at most once per GAUGE_REFRESH_SECONDS"""
+    global gauges_refreshed_at
+    now = time.monotonic()
+    if now - gauges_refreshed_at < GAUGE_REFRESH_SECONDS:
+        return False
+    gauges_refreshed_at = now
+    return True
+
+
+# (stage, seconds) of each stage run by the current request, for Server-Timing and
+# the slow-request log (None outside a request, e.g. on job worker threads)
+request_stages = ContextVar('request_stages', default=None)
+
+
+def collect_request_stages():
+    """Start collecting the stage timings of the request on this thread; returns the list"""
+    stages = []
+    request_stages.set(stages)
+    return stages
+
+
+@contextmanager
+def timed_stage(stage):
+    """Record the time spent in a block (or, as a decorator, a function) as an analysis stage"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start_time
+        STAGE_LATENCY.labels(stage).observe(elapsed)
+        stages = request_stages.get()
+        if stages is not None:
+            stages.append((stage, elapsed))
+
+
+def resident_memory_bytes():
+    """Current RSS of this process (peak RSS where /proc isn't available)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def record_resident_memory():
+    """Publish this process's RSS (also its share of the total across workers)"""
+    resident_memory = resident_memory_bytes()
+    RESIDENT_MEMORY.set(resident_memory)
+    TOTAL_RESIDENT_MEMORY.set(resident_memory)
+
+
+def record_cache_stats(cache, stats):
+    """Publish a cache's hit/miss counters"""
+    CACHE_HITS.labels(cache).set(stats['hits'])
+    CACHE_MISSES.labels(cache).set(stats['misses'])
+
+
+def render_metrics():
+    """Return (body, content type) of all metrics in Prometheus text format"""
+    if MULTIPROCESS_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
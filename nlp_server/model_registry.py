@@ -0,0 +1,75 @@
+"""
+Registry of zero-shot NLI models the server can run.
+
+A model can be selected by registry name, by the name of a directory under
+NLI_MODEL_DIR, by a local path, or by any Hugging Face model id. Each loaded
+model gets a version string (name plus a fingerprint of its config and weights)
+that is reported in responses and used in cache keys.
+"""
+import hashlib
+import os
+
+DEFAULT_MODEL = "bart-large-mnli"
+
+# Known MNLI checkpoints: the large model for batch nodes, distilled ones for busy nodes
+MODEL_REGISTRY = {
+    "bart-large-mnli": "facebook/bart-large-mnli",
+    "distilbart-mnli-12-9": "valhalla/distilbart-mnli-12-9",
+    "distilbart-mnli-12-6": "valhalla/distilbart-mnli-12-6",
+    "distilbart-mnli-12-3": "valhalla/distilbart-mnli-12-3",
+    "distilbart-mnli-12-1": "valhalla/distilbart-mnli-12-1"
+}
+
+# Directory scanned for locally stored checkpoints, each in its own subdirectory
+NLI_MODEL_DIR = os.environ.get('NLI_MODEL_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'models'))
+
+
+def list_models():
+    """Return {name: path} for registry models and checkpoints found in NLI_MODEL_DIR"""
+    models = dict(MODEL_REGISTRY)
+    if os.path.isdir(NLI_MODEL_DIR):
+        for entry in sorted(os.listdir(NLI_MODEL_DIR)):
+            path = os.path.join(NLI_MODEL_DIR, entry)
+            if os.path.isfile(os.path.join(path, 'config.json')):
+                models[entry] = path
+    return models
+
+
+def resolve_model(name_or_path):
+    """Resolve a model name or path to {'name': ..., 'path': ...}"""
+    if os.path.isdir(name_or_path):
+        return {'name': os.path.basename(os.path.normpath(name_or_path)), 'path': name_or_path}
+
+    models = list_models()
+    if name_or_path in models:
+        return {'name': name_or_path, 'path': models[name_or_path]}
+
+    # Anything else is treated as a Hugging Face model id
+    return {'name': name_or_path.split('/')[-1], 'path': name_or_path}
+
+
+def model_version(model, classifier):
+    """Version string for a loaded model: its name plus a fingerprint of its config and weights"""
+    digest = hashlib.sha256(classifier.model.config.to_json_string().encode('utf-8'))
+
+    commit_hash = getattr(classifier.model.config, '_commit_hash', None)
+    if commit_hash:
+        digest.update(commit_hash.encode('utf-8'))
+
+    # Local checkpoints have no hub revision, so fingerprint the weight files instead
+    if os.path.isdir(model['path']):
+        for filename in sorted(os.listdir(model['path'])):
+            if filename.endswith(('.bin', '.safetensors', '.onnx')):
+                stat = os.stat(os.path.join(model['path'], filename))
+                digest.update(f"{filename}:{stat.st_size}:{int(stat.st_mtime)}".encode('utf-8'))
+
+    return f"{model['name']}@{digest.hexdigest()[:10]}"
+
+
+def load_classifier(model):
+    """Load a zero-shot classification pipeline for a resolved model on CPU"""
+    # transformers (and torch) take seconds to import, so only pay for them when loading a model
+    from transformers import pipeline
+
+    return pipeline("zero-shot-classification", model=model['path'], device=-1)
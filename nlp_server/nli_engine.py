@@ -0,0 +1,374 @@
+"""
+Batched premise/hypothesis scoring for zero-shot NLI classification.
+
+The Hugging Face zero-shot pipeline runs one forward pass per call, so scoring
+every chunk against every hypothesis template means many small sequential model
+calls. These helpers build all (premise, hypothesis) pairs up front, tokenize
+them once, group them into length-sorted padded batches and reproduce the
+pipeline's multi-label scoring (softmax over contradiction vs. entailment).
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from metrics import MICROBATCH_PAIRS, MICROBATCH_QUEUE_DEPTH, MODEL_BATCH_PAIRS
+from profiling import profiled_thread_work
+from result_cache import content_key
+
+
+def get_entailment_ids(classifier):
+    """Return (contradiction_id, entailment_id) the same way the zero-shot pipeline does"""
+    entailment_id = -1
+    for label, ind in classifier.model.config.label2id.items():
+        if label.lower().startswith('entail'):
+            entailment_id = ind
+            break
+    contradiction_id = -1 if entailment_id == 0 else 0
+    return contradiction_id, entailment_id
+
+
+def score_pairs(classifier, pairs, batch_size=16, progress=None):
+    """
+    Score (premise, hypothesis) pairs with the NLI model.
+    Returns an array of entailment probabilities in the same order as `pairs`.
+    `progress(done, total)` is called with the number of pairs scored after each batch.
+    """
+    if not pairs:
+        return np.zeros(0)
+
+    # Imported here so the server can start without paying for torch until a model is used
+    import torch
+
+    tokenizer = classifier.tokenizer
+    contradiction_id, entailment_id = get_entailment_ids(classifier)
+
+    # Tokenize every pair once; padding is applied per batch below
+    encoded = tokenizer(
+        [premise for premise, _ in pairs],
+        [hypothesis for _, hypothesis in pairs],
+        add_special_tokens=True,
+        truncation='only_first'
+    )
+    input_ids = encoded['input_ids']
+    attention_mask = encoded['attention_mask']
+
+    # Length bucketing: sorting by token count keeps padding within each batch small
+    order = sorted(range(len(pairs)), key=lambda i: len(input_ids[i]))
+    scores = np.zeros(len(pairs))
+
+    for start in range(0, len(order), batch_size):
+        batch_indices = order[start:start + batch_size]
+        batch = tokenizer.pad(
+            {
+                'input_ids': [input_ids[i] for i in batch_indices],
+                'attention_mask': [attention_mask[i] for i in batch_indices]
+            },
+            return_tensors='pt'
+        )
+
+        MODEL_BATCH_PAIRS.observe(len(batch_indices))
+        with torch.no_grad():
+            logits = classifier.model(**batch).logits.float().numpy()
+
+        # Softmax over the entailment vs. contradiction logits for each pair independently
+        entail_contr_logits = logits[:, [contradiction_id, entailment_id]]
+        entail_contr_logits = entail_contr_logits - entail_contr_logits.max(axis=1, keepdims=True)
+        exp_logits = np.exp(entail_contr_logits)
+        batch_scores = exp_logits[:, 1] / exp_logits.sum(axis=1)
+
+        for i, score in zip(batch_indices, batch_scores):
+            scores[i] = score
+
+        if progress is not None:
+            progress(start + len(batch_indices), len(pairs))
+
+    return scores
+
+
+class MicroBatcher:
+    """
+    Collects premise/hypothesis pairs from concurrent requests and scores them in
+    shared model batches on a single worker thread.
+
+    Work is scored in slices of at most `max_batch_pairs` pairs, filled round-robin
+    `batch_size` pairs at a time from every waiting request, so a long document is
+    split across many slices and a small request arriving meanwhile only waits for
+    the slice in progress. A slice starts as soon as `max_batch_pairs` pairs are
+    waiting or the oldest request has waited `max_wait_ms`. A failing slice is
+    retried per request, so an error only reaches the request whose pairs caused it.
+    """
+
+    def __init__(self, get_classifier, batch_size=16, max_batch_pairs=256, max_wait_ms=5):
+        self.get_classifier = get_classifier
+        self.batch_size = batch_size
+        self.max_batch_pairs = max(batch_size, max_batch_pairs)
+        self.max_wait_ms = max_wait_ms
+        self.batches_run = 0
+        self.last_batch_pairs = 0
+        self.last_batch_requests = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # Requests with pairs left to score, in arrival order
+        self._active = []
+        self._changed = threading.Condition()
+        self._next_request = 0
+        self._thread = None
+        self._pid = None
+
+    def queue_depth(self):
+        """Number of requests waiting for (the rest of) their pairs to be scored"""
+        return len(self._active)
+
+    def score(self, pairs, progress=None):
+        """Score pairs as part of shared batches; blocks until all of this request's pairs are scored"""
+        if not pairs:
+            return np.zeros(0)
+
+        self._ensure_worker()
+        request = {
+            'pairs': pairs,
+            # Scored shortest first, so each slice's model batches need little padding
+            'order': sorted(range(len(pairs)), key=lambda i: len(pairs[i][0]) + len(pairs[i][1])),
+            'scored': 0,
+            'progress': progress,
+            'done': threading.Event(),
+            'scores': np.zeros(len(pairs)),
+            'error': None,
+            'queued_at': time.monotonic()
+        }
+        with self._changed:
+            self._active.append(request)
+            MICROBATCH_QUEUE_DEPTH.set(len(self._active))
+            self._changed.notify()
+        request['done'].wait()
+
+        if request['error'] is not None:
+            raise request['error']
+        return request['scores']
+
+    def _ensure_worker(self):
+        # Threads don't survive fork, so a forked worker process starts its own
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            if self._thread is None or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._work, name='nli-microbatcher', daemon=True)
+                self._thread.start()
+
+    def _waiting_pairs(self):
+        return sum(len(request['pairs']) - request['scored'] for request in self._active)
+
+    def _collect(self):
+        """
+        Wait for work, then take the next slice: a list of (request, indexes), taking
+        up to batch_size pairs from each request in turn, starting after the request
+        served first last time
+        """
+        with self._changed:
+            while not self._active:
+                self._changed.wait()
+
+            deadline = self._active[0]['queued_at'] + self.max_wait_ms / 1000
+            while self._waiting_pairs() < self.max_batch_pairs:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+
+            taken = {}
+            slice_pairs = 0
+            start = self._next_request % len(self._active)
+            requests = self._active[start:] + self._active[:start]
+            while slice_pairs < self.max_batch_pairs:
+                progressed = False
+                for request in requests:
+                    position = request['scored'] + len(taken.get(id(request), (None, []))[1])
+                    count = min(self.batch_size, len(request['pairs']) - position,
+                                self.max_batch_pairs - slice_pairs)
+                    if count <= 0:
+                        continue
+                    taken.setdefault(id(request), (request, []))[1].extend(
+                        request['order'][position:position + count])
+                    slice_pairs += count
+                    progressed = True
+                if not progressed:
+                    break
+            self._next_request = start + 1
+
+        MICROBATCH_PAIRS.observe(slice_pairs)
+        return list(taken.values())
+
+    def _score_slice(self, work):
+        """Score a slice; returns {id(request): scores or the exception its pairs raised}"""
+        classifier = self.get_classifier()
+        pairs = [request['pairs'][i] for request, indexes in work for i in indexes]
+        try:
+            scores = score_pairs(classifier, pairs, self.batch_size)
+        except Exception:
+            # Find out whose pairs fail, so the other requests still get their scores
+            results = {}
+            for request, indexes in work:
+                try:
+                    results[id(request)] = score_pairs(classifier, [request['pairs'][i] for i in indexes],
+                                                       self.batch_size)
+                except Exception as e:
+                    results[id(request)] = e
+            return results
+
+        results = {}
+        position = 0
+        for request, indexes in work:
+            results[id(request)] = scores[position:position + len(indexes)]
+            position += len(indexes)
+        return results
+
+    def _work(self):
+        while True:
+            work = self._collect()
+            # A request being profiled sees the model time spent on this thread too
+            with profiled_thread_work():
+                results = self._score_slice(work)
+
+            finished = []
+            for request, indexes in work:
+                result = results[id(request)]
+                if isinstance(result, Exception):
+                    request['error'] = result
+                    finished.append(request)
+                    continue
+
+                request['scores'][indexes] = result
+                request['scored'] += len(indexes)
+                if request['progress'] is not None:
+                    try:
+                        request['progress'](request['scored'], len(request['pairs']))
+                    except Exception as e:
+                        # The worker thread serves every request, so a caller's broken
+                        # callback only costs that caller its progress updates
+                        print(f"Error reporting micro-batch progress: {str(e)}")
+                        request['progress'] = None
+                if request['scored'] == len(request['pairs']):
+                    finished.append(request)
+
+            with self._changed:
+                for request in finished:
+                    self._active.remove(request)
+                MICROBATCH_QUEUE_DEPTH.set(len(self._active))
+
+            self.batches_run += 1
+            self.last_batch_pairs = sum(len(indexes) for _, indexes in work)
+            self.last_batch_requests = len(work)
+            for request in finished:
+                request['done'].set()
+
+
+def _chunk_cache_key(chunk, labels, hypothesis_templates, cache_version):
+    """Cache key for one chunk's scores against one label set and template list"""
+    return content_key(chunk, cache_version, json.dumps([labels, hypothesis_templates]))
+
+
+def score_chunks(classifier, chunks, tasks, batch_size=16, chunk_cache=None, cache_version='', progress=None):
+    """
+    Score each chunk against every task in one batched model run.
+    `tasks` maps a task name to (labels, hypothesis_templates).
+    Returns one {task: {label: score}} dict per chunk, with scores averaged over templates.
+    Chunk scores found in `chunk_cache` are reused, and repeated chunks are scored once.
+    `progress(done, total)` is called with the approximate number of chunks scored so far.
+    `classifier` may also be a MicroBatcher, which shares model batches across requests.
+    """
+    chunk_results = [{} for _ in chunks]
+
+    # (chunk, task) -> (cache key, indexes of the chunks waiting for its scores)
+    pending = {}
+    for index, chunk in enumerate(chunks):
+        for task, (labels, hypothesis_templates) in tasks.items():
+            if (chunk, task) in pending:
+                pending[(chunk, task)][1].append(index)
+                continue
+
+            key = None
+            if chunk_cache is not None:
+                key = _chunk_cache_key(chunk, labels, hypothesis_templates, cache_version)
+                cached_scores = chunk_cache.get(key)
+                if cached_scores is not None:
+                    chunk_results[index][task] = cached_scores
+                    continue
+
+            pending[(chunk, task)] = (key, [index])
+
+    # Only new or changed chunks go through the model
+    pairs = []
+    for chunk, task in pending:
+        labels, hypothesis_templates = tasks[task]
+        pairs.extend((chunk, template.format(label))
+                     for template in hypothesis_templates
+                     for label in labels)
+    # Report progress in chunks: cached chunks are done, the rest complete as pairs are scored
+    pair_progress = None
+    if progress is not None:
+        pending_chunks = len({index for _, indexes in pending.values() for index in indexes})
+        cached_chunks = len(chunks) - pending_chunks
+        progress(cached_chunks, len(chunks))
+
+        def pair_progress(done_pairs, total_pairs):
+            progress(cached_chunks + pending_chunks * done_pairs // total_pairs, len(chunks))
+
+    if isinstance(classifier, MicroBatcher):
+        pair_scores = classifier.score(pairs, pair_progress)
+    else:
+        pair_scores = score_pairs(classifier, pairs, batch_size, pair_progress)
+
+    # Fold the flat score list back into per-chunk, per-label averages over templates
+    position = 0
+    for (chunk, task), (key, indexes) in pending.items():
+        labels, hypothesis_templates = tasks[task]
+        scores = {label: 0.0 for label in labels}
+        for _ in hypothesis_templates:
+            for label in labels:
+                scores[label] += float(pair_scores[position]) / len(hypothesis_templates)
+                position += 1
+
+        if chunk_cache is not None:
+            chunk_cache.set(key, scores)
+        for index in indexes:
+            chunk_results[index][task] = scores
+
+    return chunk_results
+
+
+def classify_chunks_multi(classifier, chunks, tasks, batch_size=16, chunk_cache=None, cache_version='',
+                          progress=None):
+    """
+    Score several label sets against the same chunks in one batched model run.
+    `tasks` maps a task name to (labels, hypothesis_templates).
+    Returns {task: {label: score}} with scores averaged over templates and chunks.
+    """
+    chunk_results = score_chunks(classifier, chunks, tasks, batch_size, chunk_cache, cache_version, progress)
+
+    results = {}
+    chunk_count = len(chunks)
+    for task, (labels, _) in tasks.items():
+        label_scores = {label: 0.0 for label in labels}
+        for chunk_scores in chunk_results:
+            for label in labels:
+                label_scores[label] += chunk_scores[task][label] / chunk_count
+        results[task] = label_scores
+
+    return results
+
+
+def classify_chunks(classifier, chunks, labels, hypothesis_templates, batch_size=16,
+                    chunk_cache=None, cache_version=''):
+    """
+    Multi-label zero-shot classification of every chunk against every template.
+    Returns {label: score} averaged over templates and then over chunks.
+    """
+    results = classify_chunks_multi(classifier, chunks, {'labels': (labels, hypothesis_templates)},
+                                    batch_size, chunk_cache, cache_version)
+    return results['labels']
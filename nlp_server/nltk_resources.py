@@ -0,0 +1,67 @@
+"""
+NLTK data bundled with the NLP server.
+
+The server reads NLTK data only from NLTK_DATA_DIR (nlp_server/nltk_data by
+default) and never downloads at runtime, so startup does not depend on the
+network or on whatever happens to be in the user's home directory. Populate the
+directory once at build/install time:
+
+    python nltk_resources.py
+"""
+import os
+import sys
+
+import nltk
+
+NLTK_DATA_DIR = os.environ.get('NLTK_DATA_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'nltk_data'))
+
+# NLTK package name -> resource path looked up with nltk.data.find
+NLTK_RESOURCES = {
+    'wordnet': 'corpora/wordnet',
+    'stopwords': 'corpora/stopwords',
+    'punkt': 'tokenizers/punkt',
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',
+    'maxent_treebank_pos_tagger': 'taggers/maxent_treebank_pos_tagger',
+    'brown': 'corpora/brown'
+}
+
+
+def use_bundled_data():
+    """Make NLTK look up data in NLTK_DATA_DIR only"""
+    nltk.data.path[:] = [NLTK_DATA_DIR]
+
+
+def check_resources():
+    """Return {package: True/False} for whether each resource is present (never downloads)"""
+    found = {}
+    for package, resource in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource, paths=[NLTK_DATA_DIR])
+            found[package] = True
+        except LookupError:
+            found[package] = False
+    return found
+
+
+def download_resources():
+    """Download every resource into NLTK_DATA_DIR; returns the packages that failed"""
+    os.makedirs(NLTK_DATA_DIR, exist_ok=True)
+    failed = []
+    for package in NLTK_RESOURCES:
+        print(f"Downloading NLTK dataset: {package}")
+        try:
+            if not nltk.download(package, download_dir=NLTK_DATA_DIR, quiet=True):
+                failed.append(package)
+        except Exception as e:
+            print(f"Warning: Failed to download NLTK dataset {package}: {str(e)}")
+            failed.append(package)
+    return failed
+
+
+if __name__ == '__main__':
+    failed = download_resources()
+    if failed:
+        print(f"Failed to download NLTK datasets into {NLTK_DATA_DIR}: {', '.join(failed)}")
+        sys.exit(1)
+    print(f"NLTK data installed in {NLTK_DATA_DIR}")
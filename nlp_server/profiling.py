@@ -0,0 +1,222 @@
+"""
+Request profiling for the NLP server.
+
+- Opt-in per request (X-Profile header or ?profile=), only when PROFILING is on
+  (and with the PROFILING_TOKEN, if one is set):
+    timing    Server-Timing header with the time spent in each analysis stage
+    cprofile  cProfile dump, PROFILE_DIR/<request id>.prof
+    memory    tracemalloc top-N allocation sites, PROFILE_DIR/<request id>.memory.txt
+  Only one request is captured with cProfile/tracemalloc at a time, since both
+  hook into the whole interpreter. Model batches the NLI micro-batcher thread
+  scores during a capture are profiled too (see profiled_thread_work), including
+  pairs of other requests sharing those batches.
+- Always on: the stage timings of every request are kept until it finishes, and
+  requests slower than the SLOW_REQUEST_PERCENTILE (default 99th) percentile of
+  recent requests to the same route (and than SLOW_REQUEST_MIN_MS) are logged with their timings to
+  PROFILE_DIR/slow_requests.jsonl.
+"""
+import cProfile
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+PROFILE_MODES = ('timing', 'cprofile', 'memory')
+
+# Caller-supplied request ids are used in file names, so only simple ones are kept
+REQUEST_ID = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+# Slow-request thresholds are percentiles of this many recent requests per route,
+# recomputed every THRESHOLD_INTERVAL requests once MIN_SAMPLES have been seen
+RECENT_REQUESTS = 1000
+THRESHOLD_INTERVAL = 50
+MIN_SAMPLES = 100
+
+
+def valid_request_id(request_id):
+    return bool(request_id) and REQUEST_ID.fullmatch(request_id) is not None
+
+
+def parse_modes(flag):
+    """Profiling modes named in a header/query value ('1' or 'all' for every mode)"""
+    names = {name.strip().lower() for name in (flag or '').split(',') if name.strip()}
+    if names & {'1', 'true', 'all'}:
+        return set(PROFILE_MODES)
+    return names & set(PROFILE_MODES)
+
+
+def server_timing(stages, total_seconds):
+    """Server-Timing header value: time per stage (repeated stages added up) and the total"""
+    durations = {}
+    for stage, seconds in stages:
+        durations[stage] = durations.get(stage, 0.0) + seconds
+    metrics = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in durations.items()]
+    metrics.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ', '.join(metrics)
+
+
+class ProfileCapture:
+    """cProfile and/or tracemalloc capture of one request, written to files when it finishes"""
+
+    # Held while a capture is running
+    _busy = threading.Lock()
+    # The running capture, if any
+    current = None
+
+    def __init__(self, modes, memory_top):
+        self.modes = modes
+        self.memory_top = memory_top
+        self.profiler = None
+        # Profiles of work done for this request on other threads
+        self.thread_profilers = []
+        self._thread_lock = threading.Lock()
+        # tracemalloc may already be on (PYTHONTRACEMALLOC), in which case it is left on
+        self.owns_tracing = False
+        self.active = True
+
+    @classmethod
+    def start(cls, modes, memory_top=25):
+        """Start capturing, or return None if another request is being captured"""
+        if not cls._busy.acquire(blocking=False):
+            return None
+
+        capture = cls(modes, memory_top)
+        try:
+            if 'memory' in modes and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                capture.owns_tracing = True
+            if 'cprofile' in modes:
+                capture.profiler = cProfile.Profile()
+                capture.profiler.enable()
+        except Exception as e:
+            # e.g. another profiler already hooked into the interpreter
+            print(f"Error starting profile capture: {str(e)}")
+            capture.stop()
+            return None
+        cls.current = capture
+        return capture
+
+    def stop(self):
+        """Stop capturing; returns the tracemalloc (snapshot, peak), if any"""
+        if not self.active:
+            return None, None
+        self.active = False
+        ProfileCapture.current = None
+        try:
+            if self.profiler is not None:
+                self.profiler.disable()
+            if 'memory' in self.modes and tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                if self.owns_tracing:
+                    tracemalloc.stop()
+                return snapshot, peak
+            return None, None
+        finally:
+            self._busy.release()
+
+    def finish(self, profile_dir, request_id):
+        """Stop capturing and write the dumps; returns the file names written"""
+        snapshot, peak = self.stop()
+        os.makedirs(profile_dir, exist_ok=True)
+        files = []
+
+        if self.profiler is not None:
+            path = os.path.join(profile_dir, f"{request_id}.prof")
+            stats = pstats.Stats(self.profiler)
+            with self._thread_lock:
+                for profiler in self.thread_profilers:
+                    stats.add(profiler)
+            stats.dump_stats(path)
+            files.append(os.path.basename(path))
+
+        if snapshot is not None:
+            path = os.path.join(profile_dir, f"{request_id}.memory.txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f"Peak traced memory: {peak / 1024:.1f} KiB\n")
+                f.write(f"Top {self.memory_top} allocation sites still alive at the end of the request:\n")
+                for stat in snapshot.statistics('lineno')[:self.memory_top]:
+                    f.write(f"{stat}\n")
+            files.append(os.path.basename(path))
+
+        return files
+
+    def add_thread_profile(self, profiler):
+        with self._thread_lock:
+            if self.active:
+                self.thread_profilers.append(profiler)
+
+
+@contextmanager
+def profiled_thread_work():
+    """
+    Profile a piece of work on a helper thread (the NLI micro-batcher) into the
+    running cProfile capture; cProfile otherwise only sees the request's own thread
+    """
+    capture = ProfileCapture.current
+    if capture is None or capture.profiler is None:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ profiles every thread with the capture's own profiler
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        capture.add_thread_profile(profiler)
+
+
+class SlowRequestSampler:
+    """Flags requests slower than a percentile of the recent requests to the same route (and min_seconds)"""
+
+    def __init__(self, percentile=99, min_seconds=0.1):
+        self.percentile = percentile
+        self.min_seconds = min_seconds
+        self._durations = {}
+        self._thresholds = {}
+        self._since_update = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route, seconds):
+        """Record a request; True if it is among the slowest for its route"""
+        if self.percentile <= 0:
+            return False
+
+        with self._lock:
+            durations = self._durations.setdefault(route, deque(maxlen=RECENT_REQUESTS))
+            durations.append(seconds)
+            self._since_update[route] = self._since_update.get(route, 0) + 1
+
+            if len(durations) >= MIN_SAMPLES and (route not in self._thresholds or
+                                                  self._since_update[route] >= THRESHOLD_INTERVAL):
+                ordered = sorted(durations)
+                index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+                self._thresholds[route] = ordered[index]
+                self._since_update[route] = 0
+
+            threshold = self._thresholds.get(route)
+        return threshold is not None and seconds > max(threshold, self.min_seconds)
+
+
+def log_slow_request(profile_dir, entry):
+    """Print a slow request and append it to slow_requests.jsonl"""
+    stages = ', '.join(f"{stage} {seconds * 1000:.1f}ms" for stage, seconds in entry['stages'])
+    print(f"Slow request {entry['request_id']} {entry['method']} {entry['route']}: "
+          f"{entry['duration_ms']:.1f}ms ({stages or 'no analysis stages'})")
+    try:
+        os.makedirs(profile_dir, exist_ok=True)
+        with open(os.path.join(profile_dir, 'slow_requests.jsonl'), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(dict(entry, time=time.time())) + '\n')
+    except OSError as e:
+        print(f"Error writing slow request log: {str(e)}")
@@ -0,0 +1,178 @@
+"""
+Rhyme lookups for /get_rhymes from an index built once at startup.
+
+pronouncing.rhymes() collects and sorts every word sharing a rhyming part on
+each call. RhymeIndex keeps, per rhyming part, its words already ranked by
+corpus frequency (most common first), so a lookup only reads the first few
+entries of one or two lists. Near (slant) rhymes are grouped the same way by a
+key made of the rhyming part's vowel sequence and the class of its final
+consonant, e.g. "time" / "mine" (AY + nasal). The same groups give the rhyme
+scheme of a poem's line endings (e.g. ABAB CDCD).
+
+Word frequencies come from the Brown corpus and are stored in
+LEXICON_INDEX_DIR after the first count.
+"""
+import heapq
+import json
+import os
+import re
+from itertools import islice
+
+import pronouncing
+
+from lexicon_index import LEXICON_INDEX_DIR, write_index
+
+WORD = re.compile(r"[a-z]+(?:'[a-z]+)*")
+
+# Consonant classes for slant rhyme keys (CMUdict phones)
+CONSONANT_CLASSES = {
+    'P': 'stop', 'B': 'stop', 'T': 'stop', 'D': 'stop', 'K': 'stop', 'G': 'stop',
+    'CH': 'affricate', 'JH': 'affricate',
+    'F': 'fricative', 'V': 'fricative', 'TH': 'fricative', 'DH': 'fricative',
+    'S': 'sibilant', 'Z': 'sibilant', 'SH': 'sibilant', 'ZH': 'sibilant', 'HH': 'fricative',
+    'M': 'nasal', 'N': 'nasal', 'NG': 'nasal',
+    'L': 'liquid', 'R': 'liquid',
+    'W': 'glide', 'Y': 'glide'
+}
+
+
+def slant_key(rhyming_part):
+    """Vowels of a rhyming part (without stress) and the class of its final consonant"""
+    phones = rhyming_part.split()
+    vowels = [phone[:-1] for phone in phones if phone[-1].isdigit()]
+    final = phones[-1]
+    ending = 'open' if final[-1].isdigit() else CONSONANT_CLASSES.get(final, final)
+    return f"{' '.join(vowels)}|{ending}"
+
+
+class RhymeIndex:
+    """Words grouped by rhyming part and by slant key, each group ranked by frequency"""
+
+    def __init__(self, pronunciations, frequencies):
+        self.frequencies = frequencies
+        # word -> rhyming parts / slant keys of its pronunciations
+        self.word_parts = {}
+        self.word_slant_keys = {}
+        rhyme_groups = {}
+        slant_groups = {}
+        for word, phones in pronunciations:
+            part = pronouncing.rhyming_part(phones)
+            key = slant_key(part)
+            parts = self.word_parts.setdefault(word, [])
+            if part not in parts:
+                parts.append(part)
+                rhyme_groups.setdefault(part, []).append(word)
+            keys = self.word_slant_keys.setdefault(word, [])
+            if key not in keys:
+                keys.append(key)
+                slant_groups.setdefault(key, []).append(word)
+
+        self.rhyme_groups = {part: sorted(words, key=self.rank) for part, words in rhyme_groups.items()}
+        self.slant_groups = {key: sorted(words, key=self.rank) for key, words in slant_groups.items()}
+
+    def rank(self, word):
+        """Sort key: most frequent first, then alphabetical"""
+        return (-self.frequencies.get(word, 0), word)
+
+    def _ranked(self, groups, keys, exclude):
+        # Merge the already ranked groups, skipping duplicates and excluded words
+        seen = set()
+        for word in heapq.merge(*(groups[key] for key in keys), key=self.rank):
+            if word not in seen and not exclude(word):
+                seen.add(word)
+                yield word
+
+    def rhymes(self, word, limit=15):
+        """Perfect rhymes of a word, most frequent first (empty if the word is unknown)"""
+        parts = self.word_parts.get(word, [])
+        return list(islice(self._ranked(self.rhyme_groups, parts, lambda other: other == word), limit))
+
+    def near_rhymes(self, word, limit=15):
+        """Slant rhymes that aren't perfect rhymes, most frequent first"""
+        parts = set(self.word_parts.get(word, []))
+        keys = self.word_slant_keys.get(word, [])
+
+        def exclude(other):
+            return other == word or not parts.isdisjoint(self.word_parts[other])
+
+        return list(islice(self._ranked(self.slant_groups, keys, exclude), limit))
+
+    def rhyme_scheme(self, line_words):
+        """
+        Rhyme scheme labels of line-final words, one list per stanza: lines whose
+        words share a rhyming part (or are the same unknown word) get the same label.
+        None in line_words marks a stanza break.
+        """
+        labels = {}
+        stanzas = [[]]
+        for word in line_words:
+            if word is None:
+                if stanzas[-1]:
+                    stanzas.append([])
+                continue
+
+            keys = self.word_parts.get(word) or [word]
+            label = next((labels[key] for key in keys if key in labels), None)
+            if label is None:
+                label = scheme_label(len(set(labels.values())))
+            for key in keys:
+                labels.setdefault(key, label)
+            stanzas[-1].append(label)
+        return [stanza for stanza in stanzas if stanza]
+
+
+def scheme_label(number):
+    """A, B, ..., Z, then AA, AB, ..."""
+    label = chr(ord('A') + number % 26)
+    while number >= 26:
+        number = number // 26 - 1
+        label = chr(ord('A') + number % 26) + label
+    return label
+
+
+def line_end_words(text):
+    """Lowercase last word of every line, None for blank lines (stanza breaks)"""
+    words = []
+    for line in text.split('\n'):
+        line_words = WORD.findall(line.lower())
+        if line_words:
+            words.append(line_words[-1])
+        elif not line.strip():
+            words.append(None)
+    return words
+
+
+def count_word_frequencies():
+    """Lowercase word counts in the Brown corpus"""
+    from nltk.corpus import brown
+
+    frequencies = {}
+    for word in brown.words():
+        word = word.lower()
+        frequencies[word] = frequencies.get(word, 0) + 1
+    return frequencies
+
+
+def load_word_frequencies(index_dir=LEXICON_INDEX_DIR):
+    """Load the word frequencies from disk, counting and saving them if missing ({} without Brown)"""
+    path = os.path.join(index_dir, 'word_frequencies-brown.json')
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    try:
+        frequencies = count_word_frequencies()
+    except LookupError:
+        print("Brown corpus not found in the NLTK data, rhymes are ranked alphabetically")
+        return {}
+
+    write_index(path, frequencies)
+    return frequencies
+
+
+def build_rhyme_index():
+    """Build the rhyme index from the CMU pronouncing dictionary"""
+    pronouncing.init_cmu()
+    return RhymeIndex(pronouncing.pronunciations, load_word_frequencies())
@@ -0,0 +1,62 @@
+"""
+Production serving commands for the NLP server.
+
+    python serve.py start    # pre-forked gunicorn workers sharing one copy of the model
+    python serve.py reload   # gracefully replace the workers (SIGHUP to the master)
+    python serve.py stop     # gracefully stop the server (SIGTERM to the master)
+
+`python app.py` still starts the single-process development server.
+"""
+import os
+import signal
+import sys
+
+NLP_SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(NLP_SERVER_DIR, 'gunicorn.conf.py')
+PIDFILE = os.environ.get('NLP_PIDFILE', os.path.join(NLP_SERVER_DIR, 'nlp_server.pid'))
+
+
+def read_pid():
+    try:
+        with open(PIDFILE) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def send_signal(sig, action):
+    pid = read_pid()
+    if pid is None:
+        print(f"No running NLP server found (pidfile {PIDFILE})")
+        return 1
+
+    try:
+        os.kill(pid, sig)
+    except ProcessLookupError:
+        print(f"NLP server master {pid} is not running")
+        return 1
+
+    print(f"Sent {action} to NLP server master {pid}")
+    return 0
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'start'
+
+    if command == 'start':
+        # Replace this process with the gunicorn master
+        os.chdir(NLP_SERVER_DIR)
+        os.execvp(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', CONFIG_PATH, 'app:app'])
+    elif command == 'reload':
+        # Gunicorn starts new workers from the master's preloaded state, then
+        # lets the old ones finish their in-flight requests before exiting
+        return send_signal(signal.SIGHUP, 'graceful reload')
+    elif command == 'stop':
+        return send_signal(signal.SIGTERM, 'graceful stop')
+    else:
+        print(__doc__)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,7 +4,7 @@
 pip install -r requirements.txt
 
 # Download NLTK data if needed
-python -c "import nltk; nltk.download('wordnet')"
+python nltk_resources.py
 
 # Start the Flask server
 echo "Starting NLP server on port 5000..."
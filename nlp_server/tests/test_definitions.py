@@ -0,0 +1,80 @@
+"""
+Definition lookups: the fetch queue is bounded, and queued fetches nobody waits
+for any more are dropped.
+
+Run from nlp_server/:  python -m pytest tests
+"""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from definitions import FOUND, UNAVAILABLE, DefinitionProvider  # noqa: E402
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, word):
+        self.word = word
+
+    def json(self):
+        return [{'word': self.word}]
+
+
+@pytest.fixture
+def upstream():
+    """A stand-in for the API that blocks until released, recording the words fetched"""
+    release = threading.Event()
+    fetched = []
+
+    def get(url, timeout=None):
+        word = url.rsplit('/', 1)[-1]
+        fetched.append(word)
+        release.wait(10)
+        return FakeResponse(word)
+
+    yield get, release, fetched
+    release.set()
+
+
+def make_provider(tmp_path, get, **kwargs):
+    provider = DefinitionProvider('http://dictionary.test/', str(tmp_path / 'definitions.sqlite3'),
+                                  deadline_seconds=0.05, max_workers=1, **kwargs)
+    provider.session.get = get
+    return provider
+
+
+def test_lookups_beyond_max_pending_are_not_queued(tmp_path, upstream):
+    get, release, fetched = upstream
+    provider = make_provider(tmp_path, get, max_pending=1)
+
+    # 'alpha' has started, so it keeps running after its waiter gives up
+    assert provider.lookup('alpha') == (UNAVAILABLE, None)
+    assert provider.lookup('beta') == (UNAVAILABLE, None)
+
+    assert provider.stats()['queue_full'] == 1
+    release.set()
+    provider._executor.shutdown(wait=True)
+    assert fetched == ['alpha']
+
+
+def test_queued_fetch_is_dropped_when_its_waiter_gives_up(tmp_path, upstream):
+    get, release, fetched = upstream
+    provider = make_provider(tmp_path, get, max_pending=8)
+
+    # 'alpha' occupies the only fetch thread, so 'beta' is still queued at its deadline
+    assert provider.lookup('alpha') == (UNAVAILABLE, None)
+    assert provider.lookup('beta') == (UNAVAILABLE, None)
+
+    stats = provider.stats()
+    assert stats['dropped'] == 1
+    assert stats['in_flight'] == 1
+    release.set()
+    provider._executor.shutdown(wait=True)
+    assert fetched == ['alpha']
+    # The fetch that had started still filled the cache
+    assert provider.lookup('alpha') == (FOUND, [{'word': 'alpha'}])
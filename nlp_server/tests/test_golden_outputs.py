@@ -0,0 +1,65 @@
+"""
+The analysis functions still give the outputs recorded in benchmarks/golden.json
+from the implementation before the optimizations (with the stub model). Only the
+functions and sizes recorded there are checked. Outputs that depend on NLTK data
+are only checked where the same data is installed as when they were recorded, and
+the model functions need torch.
+
+Run from nlp_server/:  python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+NLP_SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(NLP_SERVER_DIR, 'benchmarks'))
+
+import run_benchmarks  # noqa: E402
+from corpus import build_corpus  # noqa: E402
+
+GOLDEN = run_benchmarks.load_json(run_benchmarks.GOLDEN_PATH)
+CASES = [(name, function) for name, functions in sorted(GOLDEN['outputs'].items()) for function in sorted(functions)]
+
+
+@pytest.fixture(scope='module')
+def app():
+    return run_benchmarks.load_app()
+
+
+@pytest.fixture(scope='module')
+def documents():
+    return build_corpus(sorted(GOLDEN['outputs']))
+
+
+@pytest.fixture(scope='module')
+def nltk_data(app):
+    return run_benchmarks.nltk_data_status()
+
+
+@pytest.mark.parametrize('name,function', CASES)
+def test_output_matches_golden(app, documents, nltk_data, name, function):
+    if function in run_benchmarks.MODEL_FUNCTIONS:
+        pytest.importorskip('torch')
+    different = [package for package in run_benchmarks.FUNCTION_NLTK_DATA[function]
+                 if GOLDEN['environment']['nltk_data'].get(package) != nltk_data.get(package)]
+    if different:
+        pytest.skip(f"NLTK data installed differs from the recording: {', '.join(different)}")
+
+    app.chunk_score_cache.clear()
+    output = run_benchmarks.benchmark_calls(app)[function](documents[name])
+
+    expected = GOLDEN['outputs'][name][function]
+    actual = run_benchmarks.golden_entry(output)
+    assert actual.get('value') == expected.get('value')
+    assert actual['sha256'] == expected['sha256']
+
+
+def test_batch_rhymes_match_single_lookups(app, documents, nltk_data):
+    if not nltk_data['wordnet']:
+        pytest.skip("synonyms need WordNet")
+    words = run_benchmarks.rhyme_words(documents['poem'].text)
+
+    response = app.app.test_client().post('/get_rhymes/batch', json={'words': words})
+
+    assert response.get_json()['words'] == run_benchmarks.lookup_rhymes(app, words)
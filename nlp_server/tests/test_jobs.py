@@ -0,0 +1,108 @@
+"""
+Background analysis jobs: progress, results, retention and sharing between
+worker processes.
+
+Run from nlp_server/:  python -m pytest tests
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+NLP_SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, NLP_SERVER_DIR)
+
+from jobs import JobManager  # noqa: E402
+
+
+def analysis(text, progress=None):
+    progress(stage='done', chunks_done=1, chunks_total=1)
+    return {'text': text}
+
+
+def wait_for(jobs, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get(job_id)
+        if job is not None and job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} didn't finish")
+
+
+def run_in_other_process(path, code):
+    """Run code with `jobs` (a JobManager on the same store) in a new process; returns what it prints as JSON"""
+    script = f"import json, time\nfrom jobs import JobManager\njobs = JobManager({path!r})\n{code}"
+    output = subprocess.run([sys.executable, '-c', script], cwd=NLP_SERVER_DIR, capture_output=True,
+                            text=True, timeout=30, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_job_result_and_progress(tmp_path):
+    jobs = JobManager(str(tmp_path / 'jobs.sqlite3'), max_workers=1)
+    job_id = jobs.submit(analysis, 'hello')
+
+    job = wait_for(jobs, job_id)
+
+    assert job['status'] == 'done'
+    assert job['result'] == {'text': 'hello'}
+    assert job['progress'] == {'stage': 'done', 'chunks_done': 1, 'chunks_total': 1}
+
+
+def test_oldest_finished_jobs_are_dropped_beyond_max_finished(tmp_path):
+    jobs = JobManager(str(tmp_path / 'jobs.sqlite3'), max_workers=1, max_finished=3)
+    job_ids = []
+    for i in range(5):
+        job_ids.append(jobs.submit(analysis, f"text {i}"))
+        wait_for(jobs, job_ids[-1])
+
+    assert [jobs.get(job_id) is not None for job_id in job_ids] == [False, False, True, True, True]
+
+
+def test_job_is_visible_from_another_process(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    jobs = JobManager(path, max_workers=1)
+    job_id = jobs.submit(analysis, 'shared')
+    wait_for(jobs, job_id)
+
+    job = run_in_other_process(path, f"print(json.dumps(jobs.get({job_id!r})))")
+
+    assert job['status'] == 'done'
+    assert job['result'] == {'text': 'shared'}
+
+
+def test_job_submitted_in_another_process_can_be_polled_here(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    # The other process waits for its job to finish before exiting
+    job_id = run_in_other_process(path, """
+def analysis(text, progress=None):
+    progress(stage='done', chunks_done=1, chunks_total=1)
+    return {'text': text}
+job_id = jobs.submit(analysis, 'remote')
+while jobs.get(job_id)['status'] != 'done':
+    time.sleep(0.01)
+print(json.dumps(job_id))
+""")
+
+    job = JobManager(path).get(job_id)
+
+    assert job['status'] == 'done'
+    assert job['result'] == {'text': 'remote'}
+    assert job['progress'] == {'stage': 'done', 'chunks_done': 1, 'chunks_total': 1}
+
+
+def test_job_of_an_exited_worker_is_reported_failed(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    job_id = run_in_other_process(path, """
+import os, sys
+job_id = jobs.submit(lambda progress=None: time.sleep(60))
+print(json.dumps(job_id))
+sys.stdout.flush()
+os._exit(0)
+""")
+
+    job = JobManager(path).get(job_id)
+
+    assert job['status'] == 'failed'
+    assert 'exited' in job['error']
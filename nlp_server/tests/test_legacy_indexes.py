@@ -0,0 +1,58 @@
+"""
+Legacy keyword indexes are built once on first use, and a slow build of one
+index doesn't hold up requests for another.
+
+Run from nlp_server/:  python -m pytest tests
+"""
+import os
+import sys
+import threading
+
+os.environ.setdefault('NLI_MODEL_LOADING', 'off')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+def test_index_is_built_once(monkeypatch):
+    monkeypatch.setattr(app, 'legacy_indexes', {})
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {'built': True}
+
+    threads = [threading.Thread(target=app.get_legacy_index, args=('test_once', build)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert app.get_legacy_index('test_once', build) == {'built': True}
+    assert len(builds) == 1
+
+
+def test_slow_build_does_not_block_other_indexes(monkeypatch):
+    monkeypatch.setattr(app, 'legacy_indexes', {})
+    building = threading.Event()
+    release = threading.Event()
+
+    def slow_build():
+        building.set()
+        release.wait(10)
+        return 'slow'
+
+    slow_thread = threading.Thread(target=app.get_legacy_index, args=('test_slow', slow_build))
+    slow_thread.start()
+    try:
+        assert building.wait(10)
+        other = threading.Thread(target=app.get_legacy_index, args=('test_fast', lambda: 'fast'))
+        other.start()
+        other.join(2)
+        assert not other.is_alive()
+        assert app.legacy_indexes['test_fast'] == 'fast'
+    finally:
+        release.set()
+        slow_thread.join()
+
+    assert app.legacy_indexes['test_slow'] == 'slow'
@@ -0,0 +1,107 @@
+"""
+MicroBatcher scheduling: large requests are split into slices shared round-robin
+with other requests, and model errors only fail the request that caused them.
+
+Run from nlp_server/:  python -m pytest tests
+"""
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nli_engine  # noqa: E402
+from nli_engine import MicroBatcher  # noqa: E402
+
+# Simulated model cost per pair
+SECONDS_PER_PAIR = 0.001
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    """Replace the model with one that takes SECONDS_PER_PAIR per pair and scores a pair by its premise length"""
+    batches = []
+
+    def score_pairs(classifier, pairs, batch_size=16, progress=None):
+        if any(premise == 'fail' for premise, _ in pairs):
+            raise RuntimeError("model error")
+        batches.append(list(pairs))
+        time.sleep(SECONDS_PER_PAIR * len(pairs))
+        return np.array([len(premise) for premise, _ in pairs], dtype=float)
+
+    monkeypatch.setattr(nli_engine, 'score_pairs', score_pairs)
+    return batches
+
+
+def run_in_thread(batcher, pairs, results, name):
+    def target():
+        started = time.monotonic()
+        try:
+            results[name] = (batcher.score(pairs), time.monotonic() - started)
+        except Exception as e:
+            results[name] = (e, time.monotonic() - started)
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+
+def test_scores_come_back_in_request_order(fake_model):
+    batcher = MicroBatcher(lambda: None, batch_size=4, max_batch_pairs=8, max_wait_ms=1)
+    pairs = [('x' * length, 'hypothesis') for length in (5, 1, 9, 3, 7, 2, 8, 4, 6, 10, 11)]
+
+    scores = batcher.score(pairs)
+
+    assert scores.tolist() == [float(len(premise)) for premise, _ in pairs]
+    assert all(len(batch) <= 8 for batch in fake_model)
+
+
+def test_small_request_is_not_blocked_by_large_one(fake_model):
+    batcher = MicroBatcher(lambda: None, batch_size=8, max_batch_pairs=32, max_wait_ms=1)
+    large = [(f"chunk {i}", 'hypothesis') for i in range(2000)]
+    small = [('short text', 'hypothesis')] * 8
+    results = {}
+
+    large_thread = run_in_thread(batcher, large, results, 'large')
+    time.sleep(0.05)
+    small_thread = run_in_thread(batcher, small, results, 'small')
+    small_thread.join()
+    large_thread.join()
+
+    small_scores, small_seconds = results['small']
+    large_scores, large_seconds = results['large']
+    assert small_scores.tolist() == [10.0] * 8
+    assert len(large_scores) == 2000
+    # Scored alone, the large request takes about 2s; the small one only waits for a slice or two
+    assert small_seconds < large_seconds / 5
+    # The small request shared a slice with the large one rather than waiting for it to finish
+    assert any(('short text', 'hypothesis') in batch and len(batch) > 8 for batch in fake_model)
+
+
+def test_model_error_only_fails_the_request_that_caused_it(fake_model):
+    batcher = MicroBatcher(lambda: None, batch_size=4, max_batch_pairs=64, max_wait_ms=50)
+    results = {}
+
+    threads = [run_in_thread(batcher, [('fail', 'hypothesis')], results, 'bad'),
+               run_in_thread(batcher, [('fine', 'hypothesis')] * 3, results, 'good')]
+    for thread in threads:
+        thread.join()
+
+    assert isinstance(results['bad'][0], RuntimeError)
+    assert results['good'][0].tolist() == [4.0] * 3
+
+
+def test_failing_progress_callback_does_not_stop_the_worker(fake_model):
+    batcher = MicroBatcher(lambda: None, batch_size=4, max_batch_pairs=8, max_wait_ms=1)
+
+    def progress(done, total):
+        raise KeyError("job expired")
+
+    scores = batcher.score([('broken', 'hypothesis')] * 20, progress)
+
+    assert scores.tolist() == [6.0] * 20
+    # The worker thread is still alive and serves later requests
+    assert batcher.score([('fine', 'hypothesis')]).tolist() == [4.0]
@@ -0,0 +1,85 @@
+"""
+Batched NLI scoring gives the same scores as the zero-shot pipeline it replaced,
+which ran one forward pass per (chunk, hypothesis) pair. Uses the benchmark stub
+model, so it runs offline.
+
+Run from nlp_server/:  python -m pytest tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+NLP_SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, NLP_SERVER_DIR)
+sys.path.insert(0, os.path.join(NLP_SERVER_DIR, 'benchmarks'))
+
+torch = pytest.importorskip('torch')
+
+from corpus import build_corpus  # noqa: E402
+from nli_engine import MicroBatcher, classify_chunks, classify_chunks_multi, get_entailment_ids  # noqa: E402
+from result_cache import LRUCache  # noqa: E402
+from stub_model import StubClassifier  # noqa: E402
+
+LABELS = ["War/Conflict", "Love", "Nature", "Death/Mortality", "Hope/Despair"]
+TEMPLATES = ["This text is about {}.", "The theme of this text is {}.", "This passage discusses {}."]
+
+
+@pytest.fixture(scope='module')
+def chunks():
+    # Paragraphs of very different lengths, so batches need padding
+    return build_corpus(['essay'])['essay'].text.split('\n\n')[:12]
+
+
+def reference_scores(classifier, chunks, labels, templates):
+    """Multi-label zero-shot scores, one pair per forward pass, averaged over templates and chunks"""
+    contradiction_id, entailment_id = get_entailment_ids(classifier)
+    scores = {label: 0.0 for label in labels}
+    for chunk in chunks:
+        for template in templates:
+            for label in labels:
+                encoded = classifier.tokenizer(chunk, template.format(label), truncation='only_first')
+                logits = classifier.model(input_ids=torch.tensor([encoded['input_ids']]),
+                                          attention_mask=torch.tensor([encoded['attention_mask']])).logits[0]
+                pair_logits = np.array([float(logits[contradiction_id]), float(logits[entailment_id])])
+                probabilities = np.exp(pair_logits) / np.exp(pair_logits).sum()
+                scores[label] += probabilities[1] / len(templates) / len(chunks)
+    return scores
+
+
+def assert_same_scores(actual, expected):
+    assert actual.keys() == expected.keys()
+    for label in expected:
+        # Batched scoring takes the softmax in float32, like the pipeline
+        assert actual[label] == pytest.approx(expected[label], abs=1e-6), label
+
+
+@pytest.mark.parametrize('batch_size', [1, 4, 16])
+def test_batched_scores_match_per_pair_scores(chunks, batch_size):
+    classifier = StubClassifier()
+    expected = reference_scores(classifier, chunks, LABELS, TEMPLATES)
+
+    assert_same_scores(classify_chunks(classifier, chunks, LABELS, TEMPLATES, batch_size), expected)
+
+
+def test_micro_batched_and_cached_scores_match(chunks):
+    classifier = StubClassifier()
+    expected = reference_scores(classifier, chunks, LABELS, TEMPLATES)
+    batcher = MicroBatcher(lambda: classifier, batch_size=8, max_batch_pairs=64, max_wait_ms=1)
+    cache = LRUCache(max_entries=100)
+
+    assert_same_scores(classify_chunks(batcher, chunks, LABELS, TEMPLATES, 8, cache, 'stub'), expected)
+    # Served from the chunk cache this time
+    assert_same_scores(classify_chunks(classifier, chunks, LABELS, TEMPLATES, 8, cache, 'stub'), expected)
+
+
+def test_shared_pass_matches_separate_passes(chunks):
+    classifier = StubClassifier()
+    genres = ["Poetry", "Essay", "Story"]
+    tasks = {'themes': (LABELS, TEMPLATES), 'genres': (genres, ["This example is {}."])}
+
+    results = classify_chunks_multi(classifier, chunks, tasks, batch_size=16)
+
+    assert_same_scores(results['themes'], reference_scores(classifier, chunks, LABELS, TEMPLATES))
+    assert_same_scores(results['genres'], reference_scores(classifier, chunks, genres, ["This example is {}."]))
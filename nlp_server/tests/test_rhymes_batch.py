@@ -0,0 +1,39 @@
+"""
+/get_rhymes/batch request validation.
+
+Run from nlp_server/:  python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('NLI_MODEL_LOADING', 'off')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize('body', [
+    {'words': ['day', None]},
+    {'words': ['day', 7]},
+    {'words': [['day']]},
+    {'words': 'day'},
+    {'text': ['day']},
+])
+def test_invalid_words_or_text_are_rejected(client, body):
+    response = client.post('/get_rhymes/batch', json=body)
+
+    assert response.status_code == 400
+    assert response.get_json()['words'] == {}
+
+
+def test_missing_words_and_text_are_rejected(client):
+    response = client.post('/get_rhymes/batch', json={'near': True})
+
+    assert response.status_code == 400
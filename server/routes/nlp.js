@@ -88,6 +88,100 @@ router.get('/rhymes', auth, async (req, res) => {
   }
 });
 
+// Lowercase last word of every line, null for blank lines (stanza breaks),
+// the same words the NLP server looks up for a text
+const getLineEndWords = (text) => {
+  const lineWords = [];
+  text.split('\n').forEach((line) => {
+    const words = line.toLowerCase().match(/[a-z]+(?:'[a-z]+)*/g);
+    if (words) {
+      lineWords.push(words[words.length - 1]);
+    } else if (!line.trim()) {
+      lineWords.push(null);
+    }
+  });
+  return lineWords;
+};
+
+/**
+ * @route   POST /api/nlp/rhymes/batch
+ * @desc    Get rhymes and synonyms for many words (or a poem's line endings) in one call,
+ *          plus the poem's rhyme scheme. Body: words, text, near, stream (NDJSON: the
+ *          scheme first, then one line per word, passed through as the NLP server sends it)
+ * @access  Private
+ */
+router.post('/rhymes/batch', auth, async (req, res) => {
+  const { words, text, near, stream } = req.body || {};
+
+  if ((!Array.isArray(words) || words.length === 0) && !text) {
+    return res.status(400).json({
+      success: false,
+      message: 'A words list or text is required'
+    });
+  }
+
+  // Go straight to the NLP server; if it can't be reached (or times out) fall back
+  // the same way as a failed health check
+  try {
+    const response = await axios.post(`${NLP_SERVER_URL}/get_rhymes/batch`, { words, text, near, stream }, {
+      timeout: 10000, // 10 second timeout
+      responseType: stream ? 'stream' : 'json'
+    });
+
+    if (stream) {
+      res.type('application/x-ndjson');
+      return response.data.pipe(res);
+    }
+
+    return res.json({
+      success: true,
+      data: response.data
+    });
+  } catch (apiError) {
+    console.error('Error calling NLP batch API:', apiError.message);
+
+    // The NLP server answered (e.g. 400 for a bad body, 413 for too many words):
+    // pass its response on rather than hiding the error behind fallback rhymes
+    if (apiError.response) {
+      res.status(apiError.response.status);
+      if (stream) {
+        res.type(apiError.response.headers['content-type'] || 'application/json');
+        return apiError.response.data.pipe(res);
+      }
+      return res.json(apiError.response.data);
+    }
+
+    // Same shape as the NLP server's response, without a rhyme scheme
+    const lineWords = typeof text === 'string' && text ? getLineEndWords(text) : [];
+    const header = text ? { line_words: lineWords.filter((word) => word !== null), rhyme_scheme: '' } : {};
+    const uniqueWords = [...new Set(
+      (Array.isArray(words) ? words : [])
+        .filter((word) => typeof word === 'string')
+        .map((word) => word.toLowerCase().trim())
+        .concat(lineWords)
+        .filter((word) => word)
+    )];
+
+    if (stream) {
+      res.type('application/x-ndjson');
+      res.write(`${JSON.stringify({ ...header, fallback: true })}\n`);
+      uniqueWords.forEach((word) => res.write(`${JSON.stringify(getFallbackRhymes(word))}\n`));
+      return res.end();
+    }
+
+    const fallbackWords = {};
+    uniqueWords.forEach((word) => {
+      fallbackWords[word] = getFallbackRhymes(word);
+    });
+
+    return res.json({
+      success: true,
+      data: { ...header, words: fallbackWords, fallback: true },
+      message: 'NLP service temporarily unavailable. Please try again later.'
+    });
+  }
+});
+
 /**
  * @route   GET /api/nlp/health
  * @desc    Check if NLP service is running